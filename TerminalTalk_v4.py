@@ -1,30 +1,152 @@
 import time
+import os
+
+
+# Startup profile for --profile-startup: (phase, wall, cpu, rss) recorded as each phase ends
+def current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+        except ImportError:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # peak, not current
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+STARTUP_MARKS = []
+
+
+def mark_startup(phase):
+    STARTUP_MARKS.append((phase, time.perf_counter(), time.process_time(), current_rss_bytes()))
+
+
+mark_startup("interpreter start")
+
+import collections
+import statistics
+import queue
+import itertools
+import threading
 import argparse
+import bisect
 import random
 import csv
-import os
+import mmap
+import struct
+import io
+import multiprocessing
+import concurrent.futures
+import sqlite3
+import collections.abc
+import sys
 import json 
+import array
+import hashlib
+import zlib
+import subprocess
+import shutil
+import tempfile
 import logging
+import contextlib
+import http.server
+import urllib.parse
+import logging.handlers
+import numbers
+import weakref
+import atexit
 from logging.handlers import RotatingFileHandler
 from datetime import datetime,timedelta
+mark_startup("import standard library")
 
 import requests
+mark_startup("import requests")
 
 from fastembed import TextEmbedding
+mark_startup("import fastembed")
 import numpy as np
+mark_startup("import numpy")
 
 
 # Initialize fastembed model
-EMBED_MODEL = TextEmbedding("sentence-transformers/all-MiniLM-L6-v2")
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBED_MODEL = TextEmbedding(EMBED_MODEL_NAME)
+mark_startup("embedding model (ONNX session)")
 
 try:
-    from sense_hat import SenseHat
-    sense = SenseHat()
-    sense.clear()
+    import fcntl
+except ImportError:  # Windows: no advisory locks, atomic replace still applies
+    fcntl = None
+
+class EmulatedSenseHat:
+    """
+    In-process stand-in for the SenseHat API subset TerminalTalk uses.
+    Every LED update is recorded as (perf_counter timestamp, 64-pixel frame),
+    and pixel writes are counted, so display timing and throughput can be
+    measured on any machine. Enable with TERMINALTALK_SENSE_EMULATOR=1.
+    """
+
+    def __init__(self, sensor=None):
+        self.pixels = [(0, 0, 0)] * 64
+        self.frames = []
+        self.pixel_writes = 0
+        self.low_light = False
+        self.sensor = sensor
+
+    def _record(self):
+        self.frames.append((time.perf_counter(), tuple(self.pixels)))
+
+    def set_pixels(self, pixel_list):
+        if len(pixel_list) != 64:
+            raise ValueError("Pixel lists must have 64 elements")
+        self.pixels = [tuple(p) for p in pixel_list]
+        self.pixel_writes += 64
+        self._record()
+
+    def set_pixel(self, x, y, *colour):
+        if len(colour) == 1:
+            colour = colour[0]
+        self.pixels[y * 8 + x] = tuple(colour)
+        self.pixel_writes += 1
+        self._record()
+
+    def get_pixels(self):
+        return [list(p) for p in self.pixels]
+
+    def clear(self, *colour):
+        colour = tuple(colour[0]) if len(colour) == 1 else (tuple(colour) or (0, 0, 0))
+        self.set_pixels([colour] * 64)
+
+    def show_letter(self, s, text_colour=(255, 255, 255), back_colour=(0, 0, 0)):
+        frame = render_glyph(s, text_colour, back_colour) or render_glyph("#", text_colour, back_colour)
+        self.set_pixels(frame)
+
+    def show_message(self, text_string, scroll_speed=0.1, text_colour=(255, 255, 255), back_colour=(0, 0, 0)):
+        for ch in text_string:
+            self.show_letter(ch, text_colour, back_colour)
+            time.sleep(scroll_speed * 8)
+        self.clear()
+
+    def get_temperature(self):
+        if self.sensor is None:
+            self.sensor = FakeSensor()
+        return self.sensor.get_temperature()
+
+
+if os.environ.get("TERMINALTALK_SENSE_EMULATOR"):
+    sense = EmulatedSenseHat()
     SENSE_AVAILABLE = True
-except ImportError:
-    sense = None
-    SENSE_AVAILABLE = False
+else:
+    try:
+        from sense_hat import SenseHat
+        sense = SenseHat()
+        sense.clear()
+        SENSE_AVAILABLE = True
+    except ImportError:
+        sense = None
+        SENSE_AVAILABLE = False
 
 def show_correct_symbol():
     """Show GREEN check mark on Sense HAT"""
@@ -32,23 +154,7 @@ def show_correct_symbol():
         print("[LED] Correct symbol (✔)")
         return
 
-    G = (0, 255, 0)   # Green
-    O = (0, 0, 0)     # Off
-
-    check = [
-        O,O,O,O,O,O,O,O,
-        O,O,O,O,O,O,G,O,
-        O,O,O,O,O,G,O,O,
-        G,O,O,O,G,O,O,O,
-        O,G,O,G,O,O,O,O,
-        O,O,G,O,O,O,O,O,
-        O,O,O,O,O,O,O,O,
-        O,O,O,O,O,O,O,O
-    ]
-
-    sense.set_pixels(check)
-    time.sleep(1)
-    sense.clear()
+    show_frame(FRAME_CACHE["correct"], delay=1, priority=LED_PRIORITY_FEEDBACK, key="feedback")
 
 
 def show_wrong_symbol():
@@ -57,24 +163,8 @@ def show_wrong_symbol():
         print("[LED] Wrong symbol (✖)")
         return
 
-    R = (255, 0, 0)   # Red
-    O = (0, 0, 0)     # Off
-
-    cross = [
-        R,O,O,O,O,O,O,R,
-        O,R,O,O,O,O,R,O,
-        O,O,R,O,O,R,O,O,
-        O,O,O,R,R,O,O,O,
-        O,O,O,R,R,O,O,O,
-        O,O,R,O,O,R,O,O,
-        O,R,O,O,O,O,R,O,
-        R,O,O,O,O,O,O,R
-    ]
+    show_frame(FRAME_CACHE["wrong"], delay=1, priority=LED_PRIORITY_FEEDBACK, key="feedback")
 
-    sense.set_pixels(cross)
-    time.sleep(1)
-    sense.clear()
-    
 def show_temperature_idle():
     """
     Display current temperature on Sense HAT LED matrix when app is idle.
@@ -82,13 +172,18 @@ def show_temperature_idle():
     if not SENSE_AVAILABLE:
         return
 
-    temp = sense.get_temperature()
+    # Cached reading only: the idle display never waits on the sensor bus
+    temp = SENSOR_SERVICE.get_temperature() if SENSOR_SERVICE is not None else None
+    if temp is None:
+        return
     temp = round(temp, 1)
 
-    sense.show_message(
+    show_text(
         f"{temp}C",
         scroll_speed=0.08,
-        text_colour=(0, 0, 255)
+        text_colour=IDLE_TEXT_COLOUR,
+        priority=LED_PRIORITY_IDLE,
+        key="idle"
     )
 
 # ===== Status Symbols =====
@@ -98,6 +193,28 @@ G = (0, 255, 0)   # Green
 R = (255, 0, 0)   # Red
 O = (0, 0, 0)     # Off
 
+CORRECT_SYMBOL = [
+ O,O,O,O,O,O,O,O,
+ O,O,O,O,O,O,G,O,
+ O,O,O,O,O,G,O,O,
+ G,O,O,O,G,O,O,O,
+ O,G,O,G,O,O,O,O,
+ O,O,G,O,O,O,O,O,
+ O,O,O,O,O,O,O,O,
+ O,O,O,O,O,O,O,O
+]
+
+WRONG_SYMBOL = [
+ R,O,O,O,O,O,O,R,
+ O,R,O,O,O,O,R,O,
+ O,O,R,O,O,R,O,O,
+ O,O,O,R,R,O,O,O,
+ O,O,O,R,R,O,O,O,
+ O,O,R,O,O,R,O,O,
+ O,R,O,O,O,O,R,O,
+ R,O,O,O,O,O,O,R
+]
+
 START_SYMBOL = [
  O,O,O,G,G,O,O,O,
  O,G,O,G,G,O,G,O,
@@ -132,22 +249,319 @@ GAME_EXIT_SYMBOL = [
 ]
 
 
+# ===== Precompiled Frames =====
+# 3x5 glyphs for score and temperature text; anything else falls back
+# to the Sense HAT's own show_letter().
+GLYPHS_3X5 = {
+    "0": ["###", "#.#", "#.#", "#.#", "###"],
+    "1": [".#.", "##.", ".#.", ".#.", "###"],
+    "2": ["###", "..#", "###", "#..", "###"],
+    "3": ["###", "..#", ".##", "..#", "###"],
+    "4": ["#.#", "#.#", "###", "..#", "..#"],
+    "5": ["###", "#..", "###", "..#", "###"],
+    "6": ["###", "#..", "###", "#.#", "###"],
+    "7": ["###", "..#", ".#.", ".#.", ".#."],
+    "8": ["###", "#.#", "###", "#.#", "###"],
+    "9": ["###", "#.#", "###", "..#", "###"],
+    "/": ["..#", "..#", ".#.", "#..", "#.."],
+    ":": ["...", ".#.", "...", ".#.", "..."],
+    ".": ["...", "...", "...", "...", ".#."],
+    "-": ["...", "...", "###", "...", "..."],
+    " ": ["...", "...", "...", "...", "..."],
+    "C": ["###", "#..", "#..", "#..", "###"],
+    "S": [".##", "#..", ".#.", "..#", "##."],
+    "c": ["...", "...", "###", "#..", "###"],
+    "o": ["...", "...", "###", "#.#", "###"],
+    "r": ["...", "...", "###", "#..", "#.."],
+    "e": [".#.", "#.#", "###", "#..", ".##"],
+    "#": ["###", "###", "###", "###", "###"],  # placeholder block
+}
+
+
+def compile_frame(pixels):
+    """Freeze a 64-pixel list into an immutable frame (tuple of RGB tuples)."""
+    frame = tuple(tuple(p) for p in pixels)
+    if len(frame) != 64:
+        raise ValueError("A frame needs exactly 64 pixels")
+    return frame
+
+
+_GLYPH_FRAMES = {}
+
+
+def render_glyph(ch, text_colour=(255, 255, 255), back_colour=(0, 0, 0)):
+    """Precompiled 8x8 frame for a 3x5 glyph (cached per colour), or None if unknown."""
+    cache_key = (ch, tuple(text_colour), tuple(back_colour))
+    if cache_key not in _GLYPH_FRAMES:
+        rows = GLYPHS_3X5.get(ch)
+        if rows is None:
+            return None
+        pixels = [tuple(back_colour)] * 64
+        for y, row in enumerate(rows):
+            for x, cell in enumerate(row):
+                if cell == "#":
+                    pixels[(y + 2) * 8 + x + 3] = tuple(text_colour)
+        _GLYPH_FRAMES[cache_key] = compile_frame(pixels)
+    return _GLYPH_FRAMES[cache_key]
+
+
+SCORE_COLOUR = (255, 255, 0)
+IDLE_TEXT_COLOUR = (0, 0, 255)
+
+FRAME_CACHE = {
+    "correct": compile_frame(CORRECT_SYMBOL),
+    "wrong": compile_frame(WRONG_SYMBOL),
+    "start": compile_frame(START_SYMBOL),
+    "game_start": compile_frame(GAME_START_SYMBOL),
+    "game_exit": compile_frame(GAME_EXIT_SYMBOL),
+}
+for _ch in GLYPHS_3X5:
+    render_glyph(_ch, SCORE_COLOUR)
+    render_glyph(_ch, IDLE_TEXT_COLOUR)
+
+
+class FrameBufferDisplay:
+    """
+    Wraps a SenseHat-like display and remembers the last frame pushed, so a
+    new frame only writes the pixels that changed (set_pixel) unless most
+    of the matrix changes (one set_pixels call is cheaper then).
+    """
+
+    FULL_REDRAW_THRESHOLD = 24
+
+    def __init__(self, display):
+        self.display = display
+        self.current = None  # unknown until we draw a full frame
+
+    def push(self, frame):
+        if self.current is None:
+            self.display.set_pixels(list(frame))
+        else:
+            changed = [i for i in range(64) if frame[i] != self.current[i]]
+            if len(changed) > self.FULL_REDRAW_THRESHOLD:
+                self.display.set_pixels(list(frame))
+            else:
+                for i in changed:
+                    self.display.set_pixel(i % 8, i // 8, frame[i])
+        self.current = frame
+
+    def set_pixels(self, pixels):
+        self.push(compile_frame(pixels))
+
+    def show_letter(self, ch, text_colour=(255, 255, 255), back_colour=(0, 0, 0)):
+        frame = render_glyph(ch, text_colour, back_colour)
+        if frame is None:
+            self.display.show_letter(ch, text_colour=text_colour, back_colour=back_colour)
+            self.current = None
+        else:
+            self.push(frame)
+
+    def clear(self):
+        self.display.clear()
+        self.current = compile_frame([(0, 0, 0)] * 64)
+
+
 def show_symbol(symbol, delay=1.5):
     if not SENSE_AVAILABLE:
         return
-    sense.set_pixels(symbol)
-    time.sleep(delay)
-    sense.clear()
+    show_frame(symbol, delay=delay, key="status")
 
 def show_score_on_led(score):
     if not SENSE_AVAILABLE:
         return
-    sense.show_message(
+    show_text(
         f"Score:{score}",
         scroll_speed=0.08,
-        text_colour=(255, 255, 0)
+        text_colour=SCORE_COLOUR,
+        key="score"
+    )
+
+
+# ===== LED Display Worker =====
+# Lower number = more important. Feedback preempts status symbols, which
+# preempt the idle temperature display.
+LED_PRIORITY_FEEDBACK = 0
+LED_PRIORITY_NORMAL = 5
+LED_PRIORITY_IDLE = 9
+
+
+class LedDisplayWorker(threading.Thread):
+    """
+    Plays LED animations from a priority queue on a background thread, so
+    callers enqueue and return immediately.
+
+    An animation is a list of (action, hold_seconds) steps; action is called
+    with the display. Queued animations with the same key coalesce (only the
+    newest runs). Submitting an animation with a higher priority, or with the
+    same key as the one playing, interrupts it between steps.
+    """
+
+    _STOP = float("inf")
+
+    def __init__(self, display):
+        super().__init__(name="led-display", daemon=True)
+        self.display = FrameBufferDisplay(display)
+        self.queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._latest = {}       # key -> seq of the newest submission
+        self._current = None    # (priority, seq, key) of the playing animation
+        self._preempt = threading.Event()
+        self._lock = threading.Lock()
+
+    def submit(self, steps, priority=LED_PRIORITY_NORMAL, key=None):
+        with self._lock:
+            seq = next(self._seq)
+            if key is not None:
+                self._latest[key] = seq
+            if self._current is not None and (
+                priority < self._current[0] or (key is not None and key == self._current[2])
+            ):
+                self._preempt.set()
+        self.queue.put((priority, seq, key, steps))
+
+    def cancel(self, key):
+        """Drop queued animations with this key and stop it if it is playing."""
+        with self._lock:
+            self._latest[key] = next(self._seq)
+            if self._current is not None and self._current[2] == key:
+                self._preempt.set()
+
+    def is_busy(self, key=None):
+        with self._lock:
+            if self._current is None:
+                return False
+            return key is None or self._current[2] == key
+
+    def run(self):
+        while True:
+            priority, seq, key, steps = self.queue.get()
+            if priority == self._STOP:
+                return
+
+            with self._lock:
+                if key is not None and self._latest.get(key) != seq:
+                    continue  # superseded by a newer submission with the same key
+                self._current = (priority, seq, key)
+                self._preempt.clear()
+
+            try:
+                for action, hold in steps:
+                    if self._preempt.is_set():
+                        break
+                    action(self.display)
+                    if hold and self._preempt.wait(hold):
+                        break
+                self.display.clear()
+            except Exception:
+                logging.getLogger(__name__).exception("LED animation failed")
+            finally:
+                with self._lock:
+                    self._current = None
+
+    def stop(self, timeout=None):
+        """Let queued animations finish, then stop the thread."""
+        self.queue.put((self._STOP, next(self._seq), None, None))
+        if self.is_alive():
+            self.join(timeout)
+
+
+LED_WORKER = None
+
+
+def get_led_worker():
+    """Start the LED worker on first use (only when a Sense HAT is present)."""
+    global LED_WORKER
+    if LED_WORKER is None:
+        LED_WORKER = LedDisplayWorker(sense)
+        LED_WORKER.start()
+    return LED_WORKER
+
+
+def shutdown_led_worker(timeout=5):
+    global LED_WORKER
+    if LED_WORKER is not None:
+        LED_WORKER.stop(timeout)
+        LED_WORKER = None
+
+
+def show_frame(pixels, delay=1.5, priority=LED_PRIORITY_NORMAL, key=None):
+    """Queue a single 64-pixel frame, held for delay seconds then cleared."""
+    frame = pixels if isinstance(pixels, tuple) else compile_frame(pixels)
+    get_led_worker().submit(
+        [(lambda d: d.push(frame), delay)],
+        priority=priority,
+        key=key
     )
 
+
+IDLE_DISPLAY_DELAY_SECONDS = 10
+
+
+class IdleTemperatureDisplay:
+    """
+    Shows the temperature on the LED matrix once the prompt has been idle
+    for `delay` seconds (and again every `delay` seconds while still idle).
+    disarm() cancels the timer and stops a running animation immediately.
+    """
+
+    def __init__(self, delay=IDLE_DISPLAY_DELAY_SECONDS, show=None):
+        self.delay = delay
+        self.show = show if show is not None else show_temperature_idle
+        self._timer = None
+        self._armed = False
+        self._lock = threading.Lock()
+
+    def arm(self):
+        if self.delay is None or self.delay < 0:
+            return
+        with self._lock:
+            self._armed = True
+            self._schedule()
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.delay, self._fire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _fire(self):
+        if not self._armed:
+            return
+        self.show()
+        with self._lock:
+            if self._armed:
+                self._schedule()
+                return
+        # Input arrived while we were queueing the animation
+        self._cancel_animation()
+
+    def disarm(self):
+        with self._lock:
+            self._armed = False
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self._cancel_animation()
+
+    @staticmethod
+    def _cancel_animation():
+        if LED_WORKER is not None:
+            LED_WORKER.cancel("idle")
+
+
+def show_text(text, scroll_speed=0.08, text_colour=(255, 255, 255), priority=LED_PRIORITY_NORMAL, key=None):
+    """
+    Queue a text message. Letters are shown one by one, each held for about
+    the time show_message() needs to scroll one 8-column character, so a
+    newer message can interrupt between letters.
+    """
+    steps = [
+        (lambda d, ch=ch: d.show_letter(ch, text_colour=text_colour), scroll_speed * 8)
+        for ch in text
+    ]
+    get_led_worker().submit(steps, priority=priority, key=key)
+
 ######################### Weather ########################
 WEATHER_API_KEY = "14092eaa1f7e9716920780eb8684ecbb"
 DEFAULT_CITY = "Wolfenbuettel"  # ASCII-safe for OpenWeather
@@ -164,15 +578,22 @@ LOCATION_INTENT_LABELS = [
     "library location",
     "cafeteria location"
 ]
-LOCATION_INTENT_EMBEDDINGS = np.array([
-    next(EMBED_MODEL.embed([label]))
-    for label in LOCATION_INTENT_LABELS
-])
+LOCATION_INTENT_EMBEDDINGS = None  # built on first use, or taken from a compiled bundle
+
+
+def get_location_intent_embeddings():
+    global LOCATION_INTENT_EMBEDDINGS
+    if LOCATION_INTENT_EMBEDDINGS is None:
+        LOCATION_INTENT_EMBEDDINGS = np.array(list(EMBED_MODEL.embed(LOCATION_INTENT_LABELS)))
+    return LOCATION_INTENT_EMBEDDINGS
+
+
 def is_location_question_semantic(question: str, threshold=0.55):
-    q_vec = next(EMBED_MODEL.embed([question.lower()]))
+    q_vec = embed_query(question.lower(), "location_intent")
+    intents = get_location_intent_embeddings()
 
-    scores = LOCATION_INTENT_EMBEDDINGS @ q_vec / (
-        np.linalg.norm(LOCATION_INTENT_EMBEDDINGS, axis=1) *
+    scores = intents @ q_vec / (
+        np.linalg.norm(intents, axis=1) *
         np.linalg.norm(q_vec)
     )
 
@@ -189,6 +610,7 @@ def fetch_weather(city: str):
         data = r.json()
 
         if r.status_code != 200:
+            METRICS.inc("terminaltalk_weather_failures_total", (("reason", f"http_{r.status_code}"),))
             return " Weather data currently unavailable."
 
         temp = data["main"]["temp"]
@@ -196,38 +618,580 @@ def fetch_weather(city: str):
 
         return f"Weather in {city}: {temp}°C, {desc}"
 
-    except Exception:
+    except Exception as e:
+        METRICS.inc("terminaltalk_weather_failures_total", (("reason", type(e).__name__),))
         return "Weather information unavailable."
 
 
 TEMP_LOG_FILE = "temperature_log.json"
 MONITOR_INTERVAL_SECONDS = 1800  # ~30 minutes
-TEMP_RAW_LOG_FILE = "temperature_raw_log.json"
-def log_raw_temperature():
+TEMP_RAW_LOG_FILE = "temperature_raw_log.json"  # legacy JSON raw log, migrated into the ring
+TEMP_RING_FILE = "temperature_raw.ring"
+TEMP_RING_CAPACITY = 200_000  # ~2.4 MB on disk; ~4.5 months at one sample per minute
+LECTURE_START_HOUR = 9
+LECTURE_END_HOUR = 17
+
+# Retention: raw samples are compacted into daily summaries after
+# RAW_RETENTION_DAYS; daily summaries are dropped after SUMMARY_RETENTION_DAYS.
+RAW_RETENTION_DAYS = 14
+SUMMARY_RETENTION_DAYS = 365
+COMPACTION_INTERVAL_SECONDS = 3600
+TEMP_LOG_BACKUPS = 2
+
+RING_MAGIC = b"TTRING01"
+RING_HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("capacity", "<u8"),
+    ("head", "<u8"),      # next slot to write
+    ("count", "<u8"),     # valid samples (<= capacity)
+    ("written", "<u8"),   # total samples ever written, used to detect foreign writers
+])
+RING_SAMPLE_DTYPE = np.dtype([("ts", "<f8"), ("temp", "<f4")])
+
+
+def local_utc_offsets(ts):
     """
-    Store raw temperature readings every ~30 minutes with timestamp.
+    Local UTC offset (seconds) for every timestamp in ts.
+    localtime() is only evaluated once per distinct epoch hour, so DST changes
+    inside the range are handled without a Python loop over every sample.
     """
-    if not SENSE_AVAILABLE:
-        return
+    ts = np.asarray(ts, dtype=np.float64)
+    if ts.size == 0:
+        return np.zeros(0)
+    epoch_hours, inverse = np.unique(np.floor(ts / 3600), return_inverse=True)
+    offsets = np.array([time.localtime(h * 3600).tm_gmtoff for h in epoch_hours], dtype=np.float64)
+    return offsets[inverse.reshape(-1)]
+
+
+def local_hours(ts):
+    """Local hour of day (0-23) for every timestamp in ts."""
+    ts = np.asarray(ts, dtype=np.float64)
+    return (np.floor((ts + local_utc_offsets(ts)) / 3600) % 24).astype(np.int64)
+
+
+def local_day_index(ts):
+    """Local calendar day (days since 1970-01-01) for every timestamp in ts."""
+    ts = np.asarray(ts, dtype=np.float64)
+    return np.floor((ts + local_utc_offsets(ts)) / 86400).astype(np.int64)
+
+
+def day_index_to_str(day_idx):
+    return (datetime(1970, 1, 1) + timedelta(days=int(day_idx))).strftime("%Y-%m-%d")
+
+
+class TemperatureRingBuffer:
+    """
+    Fixed-size ring of (timestamp float64, temp float32) samples in a
+    memory-mapped file. Once full, the oldest samples are overwritten.
+    Samples are kept in chronological order (window() binary-searches):
+    append_many() expects ordered input, insert_many() accepts any order.
+    """
+
+    def __init__(self, path=TEMP_RING_FILE, capacity=TEMP_RING_CAPACITY):
+        self.path = path
+
+        with file_lock(path):
+            if not os.path.exists(path) or os.path.getsize(path) < RING_HEADER_DTYPE.itemsize:
+                header = np.zeros(1, dtype=RING_HEADER_DTYPE)
+                header["magic"] = RING_MAGIC
+                header["capacity"] = capacity
+                with open(path, "wb") as f:
+                    f.write(header.tobytes())
+                    f.truncate(RING_HEADER_DTYPE.itemsize + capacity * RING_SAMPLE_DTYPE.itemsize)
+
+        self._header = np.memmap(path, dtype=RING_HEADER_DTYPE, mode="r+", shape=(1,))
+        if self._header["magic"][0] != RING_MAGIC:
+            raise ValueError(f"{path} is not a temperature ring file")
+
+        self.capacity = int(self._header["capacity"][0])
+        self._samples = np.memmap(
+            path, dtype=RING_SAMPLE_DTYPE, mode="r+",
+            offset=RING_HEADER_DTYPE.itemsize, shape=(self.capacity,)
+        )
 
-    now = datetime.now()
-    entry = {
-        "timestamp": now.timestamp(),
-        "time": now.strftime("%Y-%m-%d %H:%M:%S"),
-        "temp": round(sense.get_temperature(), 2)
+    @property
+    def count(self):
+        return int(self._header["count"][0])
+
+    @property
+    def written(self):
+        return int(self._header["written"][0])
+
+    def append_many(self, timestamps, temps):
+        """Append samples (oldest first), overwriting the oldest slots when full."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        temps = np.asarray(temps, dtype=np.float32)
+        n = timestamps.size
+        if n == 0:
+            return
+
+        if n > self.capacity:
+            timestamps, temps = timestamps[-self.capacity:], temps[-self.capacity:]
+
+        head = int(self._header["head"][0])
+        slots = (head + np.arange(timestamps.size)) % self.capacity
+        self._samples["ts"][slots] = timestamps
+        self._samples["temp"][slots] = temps
+
+        self._header["head"] = (head + timestamps.size) % self.capacity
+        self._header["count"] = min(self.capacity, self.count + timestamps.size)
+        self._header["written"] = self.written + n
+        self._samples.flush()
+        self._header.flush()
+
+    def insert_many(self, timestamps, temps):
+        """
+        Add samples in any order. Samples older than the newest stored one
+        (interleaved writers, a wall clock stepped back) are merged into
+        place by rewriting the ring's tail, so window() stays sorted.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        temps = np.asarray(temps, dtype=np.float32)
+        if timestamps.size == 0:
+            return
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, temps = timestamps[order], temps[order]
+
+        ts, stored = self.ordered()
+        if not ts.size or timestamps[0] >= ts[-1]:
+            self.append_many(timestamps, temps)
+            return
+
+        k = int(np.searchsorted(ts, timestamps[0], side="right"))
+        merged_ts = np.concatenate((ts[k:], timestamps))
+        merged_temps = np.concatenate((stored[k:], temps))
+        order = np.argsort(merged_ts, kind="stable")
+
+        # Rewind over the tail, then write tail + new samples back in order
+        written = self.written
+        self._header["head"] = (int(self._header["head"][0]) - (self.count - k)) % self.capacity
+        self._header["count"] = k
+        self.append_many(merged_ts[order], merged_temps[order])
+        self._header["written"] = written + timestamps.size
+        self._header.flush()
+
+    def ordered(self):
+        """Return (timestamps, temps) oldest first. Views when the valid range is contiguous."""
+        count = self.count
+        start = (int(self._header["head"][0]) - count) % self.capacity
+
+        if start + count <= self.capacity:
+            view = self._samples[start:start + count]
+        else:
+            view = np.concatenate((self._samples[start:], self._samples[:(start + count) % self.capacity]))
+        return view["ts"], view["temp"]
+
+    def drop_oldest(self, n):
+        """Forget the n oldest samples (their slots are reused by later appends)."""
+        n = min(max(0, n), self.count)
+        if n:
+            self._header["count"] = self.count - n
+            self._header.flush()
+
+    def window(self, start_ts, end_ts):
+        """Return (timestamps, temps) with start_ts <= ts < end_ts (binary search)."""
+        ts, temps = self.ordered()
+        lo, hi = np.searchsorted(ts, [start_ts, end_ts], side="left")
+        return ts[lo:hi], temps[lo:hi]
+
+
+def temperature_stats(temps, mask=None):
+    """count/sum/min/max of a temperature array, optionally filtered by a boolean mask."""
+    if mask is not None:
+        temps = temps[mask]
+    if temps.size == 0:
+        return {"count": 0, "sum": 0.0, "min": None, "max": None}
+    temps = temps.astype(np.float64)
+    return {
+        "count": int(temps.size),
+        "sum": float(temps.sum()),
+        "min": round(float(temps.min()), 2),
+        "max": round(float(temps.max()), 2),
     }
 
-    data = []
-    if os.path.exists(TEMP_RAW_LOG_FILE):
-        with open(TEMP_RAW_LOG_FILE, "r") as f:
-            data = json.load(f)
 
-    data.append(entry)
+class TemperatureStore:
+    """
+    Time-indexed raw temperature samples with incremental rollups.
 
-    with open(TEMP_RAW_LOG_FILE, "w") as f:
-        json.dump(data, f, indent=2)
-LECTURE_START_HOUR = 9
-LECTURE_END_HOUR = 17
+    Raw samples live in a memory-mapped ring buffer, so range queries are a
+    binary search plus NumPy masks over the mapped arrays. Every sample also
+    updates a daily aggregate and an hour-of-day aggregate (count, sum, min,
+    max), so hour-window averages over N days only touch N * 24 buckets.
+    """
+
+    def __init__(self, ring_path=TEMP_RING_FILE, capacity=TEMP_RING_CAPACITY,
+                 legacy_raw_path=TEMP_RAW_LOG_FILE):
+        self.ring_path = ring_path
+        self.capacity = capacity
+        self.legacy_raw_path = legacy_raw_path
+        self.ring = None
+        self.daily = {}
+        self._seen_state = None
+
+    def exists(self):
+        return os.path.exists(self.ring_path) or (
+            self.legacy_raw_path is not None and os.path.exists(self.legacy_raw_path)
+        )
+
+    @staticmethod
+    def _new_bucket():
+        return {"count": 0, "sum": 0.0, "min": None, "max": None}
+
+    @staticmethod
+    def _merge_bucket(total, bucket):
+        if not bucket["count"]:
+            return
+        total["count"] += bucket["count"]
+        total["sum"] += bucket["sum"]
+        total["min"] = bucket["min"] if total["min"] is None else min(total["min"], bucket["min"])
+        total["max"] = bucket["max"] if total["max"] is None else max(total["max"], bucket["max"])
+
+    def load(self):
+        """Open the ring on first use and rebuild rollups if another writer appended."""
+        if self.ring is None:
+            self.ring = TemperatureRingBuffer(self.ring_path, self.capacity)
+            with file_lock(self.ring_path):
+                self._migrate_legacy_log()
+
+        if self._ring_state() != self._seen_state:
+            self._rebuild_rollups()
+
+    def _ring_state(self):
+        # Appends bump "written"; compaction only lowers "count"
+        return self.ring.written, self.ring.count
+
+    def _migrate_legacy_log(self):
+        """Import the old JSON raw log once, into an empty ring."""
+        if self.ring.written or not self.legacy_raw_path or not os.path.exists(self.legacy_raw_path):
+            return
+
+        data = load_json_file(self.legacy_raw_path, None)
+        if not isinstance(data, list):
+            # Corrupt files were moved aside by load_json_file(); nothing to import
+            return
+
+        data.sort(key=lambda e: e["timestamp"])
+        self.ring.append_many([e["timestamp"] for e in data], [e["temp"] for e in data])
+
+        # The JSON log is no longer written; rotate it out of the way
+        rotate_file(self.legacy_raw_path, TEMP_LOG_BACKUPS)
+
+    def _rebuild_rollups(self):
+        ts, temps = self.ring.ordered()
+        self.daily = {}
+        self._index(ts, temps)
+        self._seen_state = self._ring_state()
+
+    def _index(self, ts, temps):
+        """Fold samples into the day / hour-of-day rollups (grouped with NumPy)."""
+        if len(ts) == 0:
+            return
+
+        ts = np.asarray(ts, dtype=np.float64)
+        temps = np.asarray(temps, dtype=np.float64)
+        keys = local_day_index(ts) * 24 + local_hours(ts)
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        counts = np.bincount(inverse)
+        sums = np.bincount(inverse, weights=temps)
+        mins = np.full(uniq.size, np.inf)
+        maxs = np.full(uniq.size, -np.inf)
+        np.minimum.at(mins, inverse, temps)
+        np.maximum.at(maxs, inverse, temps)
+
+        for key, count, total, lo, hi in zip(uniq, counts, sums, mins, maxs):
+            bucket = {"count": int(count), "sum": float(total),
+                      "min": round(float(lo), 2), "max": round(float(hi), 2)}
+            day = self.daily.setdefault(
+                day_index_to_str(key // 24),
+                {**self._new_bucket(), "hours": {}}
+            )
+            self._merge_bucket(day, bucket)
+            self._merge_bucket(day["hours"].setdefault(int(key % 24), self._new_bucket()), bucket)
+
+    def add(self, ts, temp):
+        """Add one sample and update rollups."""
+        self.add_many([(ts, temp)])
+
+    def add_many(self, samples):
+        """Append a batch of (timestamp, temp) samples to the ring in one write."""
+        if not samples:
+            return
+        self.load()
+        samples = sorted(samples)
+        ts = [t for t, _ in samples]
+        temps = [v for _, v in samples]
+
+        with file_lock(self.ring_path):
+            before = self._ring_state()
+            self.ring.insert_many(ts, temps)
+
+        if before != self._seen_state:
+            # Another process appended since our last look: rebuild from the ring
+            self._rebuild_rollups()
+        else:
+            self._index(ts, np.asarray(temps, dtype=np.float32))
+            self._seen_state = self._ring_state()
+
+    def range_samples(self, start_ts, end_ts):
+        """Return (timestamps, temps) arrays with start_ts <= ts < end_ts."""
+        self.load()
+        return self.ring.window(start_ts, end_ts)
+
+    def range_stats(self, start_ts, end_ts, start_hour=None, end_hour=None):
+        """
+        count/sum/min/max for samples with start_ts <= ts < end_ts,
+        optionally restricted to local hours [start_hour, end_hour).
+        """
+        ts, temps = self.range_samples(start_ts, end_ts)
+        mask = None
+        if start_hour is not None:
+            hours = local_hours(ts)
+            mask = (hours >= start_hour) & (hours < end_hour)
+        return temperature_stats(temps, mask)
+
+    def hour_window_stats(self, since_ts, start_hour, end_hour, now=None):
+        """
+        Aggregate samples newer than since_ts whose local hour lies in
+        [start_hour, end_hour).
+
+        Only the partial day that contains since_ts is filtered sample by
+        sample (vectorized); every later day is answered from its hourly rollups.
+        """
+        self.load()
+        now = datetime.now() if now is None else now
+        total = self._new_bucket()
+
+        first_day = datetime.fromtimestamp(since_ts).date()
+        next_midnight = datetime.combine(first_day + timedelta(days=1), datetime.min.time())
+        self._merge_bucket(
+            total,
+            self.range_stats(since_ts, next_midnight.timestamp(), start_hour, end_hour)
+        )
+
+        day = first_day + timedelta(days=1)
+        while day <= now.date():
+            rollup = self.daily.get(day.strftime("%Y-%m-%d"))
+            if rollup:
+                for hour in range(start_hour, end_hour):
+                    if hour in rollup["hours"]:
+                        self._merge_bucket(total, rollup["hours"][hour])
+            day += timedelta(days=1)
+
+        return total
+
+    def expired_rollups(self, raw_days=RAW_RETENTION_DAYS):
+        """
+        Return (rollups, n) for raw samples from days older than raw_days:
+        the rollups of those days, to be kept as summaries, and how many
+        samples drop_oldest() should remove afterwards.
+        """
+        self.load()
+        cutoff = datetime.combine(datetime.now().date() - timedelta(days=raw_days), datetime.min.time())
+        ts, _ = self.ring.ordered()
+        n_old = int(np.searchsorted(ts, cutoff.timestamp(), side="left"))
+        if not n_old:
+            return {}, 0
+
+        expired = {}
+        for day_idx in np.unique(local_day_index(ts[:n_old])):
+            day = day_index_to_str(day_idx)
+            if day in self.daily:
+                expired[day] = self.daily[day]
+        return expired, n_old
+
+    def drop_oldest(self, n):
+        """Drop the n oldest raw samples and rebuild rollups for what remains."""
+        if not n:
+            return
+        self.load()
+        with file_lock(self.ring_path):
+            self.ring.drop_oldest(n)
+        self._rebuild_rollups()
+
+    def daily_min_max(self, days):
+        """{"YYYY-MM-DD": (min, max)} for the last `days` calendar days, from raw samples."""
+        self.load()
+        start = datetime.combine(datetime.now().date() - timedelta(days=days - 1), datetime.min.time())
+        ts, temps = self.ring.window(start.timestamp(), float("inf"))
+        if ts.size == 0:
+            return {}
+
+        day_idx = local_day_index(ts)
+        result = {}
+        for d in np.unique(day_idx):
+            day_temps = temps[day_idx == d]
+            result[day_index_to_str(d)] = (round(float(day_temps.min()), 2), round(float(day_temps.max()), 2))
+        return result
+
+
+TEMPERATURE_STORE = TemperatureStore()
+
+
+def rotate_file(path, backups=TEMP_LOG_BACKUPS):
+    """
+    Rotate path -> path.1 -> ... -> path.<backups> with os.replace,
+    so every name always points at a complete file.
+    """
+    if not os.path.exists(path):
+        return
+    if backups < 1:
+        os.remove(path)
+        return
+
+    for i in range(backups - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    os.replace(path, f"{path}.1")
+
+
+_FILE_LOCKS = {}
+_FILE_LOCKS_GUARD = threading.Lock()
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    Exclusive advisory lock shared by every TerminalTalk process touching path.
+    The lock lives in a separate "<path>.lock" file so os.replace() of path
+    does not drop it. Re-entrant within a thread; other threads of this
+    process wait on an in-process lock before the flock is taken.
+    """
+    key = os.path.abspath(path)
+    with _FILE_LOCKS_GUARD:
+        state = _FILE_LOCKS.setdefault(key, {"lock": threading.RLock(), "depth": 0, "file": None})
+
+    with state["lock"]:
+        if state["depth"] == 0 and fcntl is not None:
+            state["file"] = open(f"{key}.lock", "a")
+            fcntl.flock(state["file"].fileno(), fcntl.LOCK_EX)
+        state["depth"] += 1
+        try:
+            yield
+        finally:
+            state["depth"] -= 1
+            if state["depth"] == 0 and state["file"] is not None:
+                fcntl.flock(state["file"].fileno(), fcntl.LOCK_UN)
+                state["file"].close()
+                state["file"] = None
+
+
+def load_json_file(path, default):
+    """
+    Read a JSON file, returning default if it is missing. A corrupted file
+    (e.g. truncated by an older, non-atomic writer) is moved aside to
+    "<path>.corrupt" instead of crashing every later run.
+    """
+    if not os.path.exists(path):
+        return default
+
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        logging.getLogger(__name__).warning("Corrupted JSON file moved aside: %s", path)
+        os.replace(path, f"{path}.corrupt")
+        return default
+
+
+def atomic_write_json(path, data):
+    """Write JSON to a temp file in the same directory and os.replace() it over path."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def compact_temperature_logs(store=None, raw_days=None, summary_days=None):
+    """
+    Apply retention to the temperature logs:
+    - raw samples older than raw_days are downsampled into TEMP_LOG_FILE
+      (daily count/avg/min/max plus per-hour rollups) and dropped from the ring,
+    - daily summaries older than summary_days are removed; the previous
+      summary file is kept as a rotated backup.
+    """
+    store = store if store is not None else TEMPERATURE_STORE
+    raw_days = RAW_RETENTION_DAYS if raw_days is None else raw_days
+    summary_days = SUMMARY_RETENTION_DAYS if summary_days is None else summary_days
+
+    if not store.exists():
+        _compact_summaries({}, summary_days)
+        return
+
+    # Lock order: ring, then summary file (the sampler never holds both)
+    with file_lock(store.ring_path):
+        rollups, n_old = store.expired_rollups(raw_days)
+        _compact_summaries(rollups, summary_days)
+        # Raw samples are only dropped once their summaries are on disk
+        store.drop_oldest(n_old)
+
+
+def _compact_summaries(rollups, summary_days):
+    logger = logging.getLogger(__name__)
+
+    with file_lock(TEMP_LOG_FILE):
+        _write_compacted_summaries(load_json_file(TEMP_LOG_FILE, {}), rollups, summary_days)
+
+    if rollups:
+        logger.info("Temperature logs compacted: %d day(s) summarized", len(rollups))
+
+
+def _write_compacted_summaries(data, rollups, summary_days):
+    for day, rollup in rollups.items():
+        entry = data.setdefault(day, {"min": rollup["min"], "max": rollup["max"], "last_updated": 0})
+        entry["min"] = min(entry["min"], rollup["min"])
+        entry["max"] = max(entry["max"], rollup["max"])
+        entry["count"] = rollup["count"]
+        entry["avg"] = round(rollup["sum"] / rollup["count"], 2)
+        entry["hours"] = {
+            str(hour): {
+                "count": b["count"],
+                "avg": round(b["sum"] / b["count"], 2),
+                "min": b["min"],
+                "max": b["max"]
+            }
+            for hour, b in sorted(rollup["hours"].items())
+        }
+
+    oldest_kept = (datetime.now().date() - timedelta(days=summary_days)).strftime("%Y-%m-%d")
+    expired = [day for day in data if day < oldest_kept]
+    for day in expired:
+        del data[day]
+
+    if not rollups and not expired:
+        return
+
+    if expired:
+        # Keep the pre-prune file as a backup (hard link, so TEMP_LOG_FILE never disappears)
+        for i in range(TEMP_LOG_BACKUPS - 1, 0, -1):
+            if os.path.exists(f"{TEMP_LOG_FILE}.{i}"):
+                os.replace(f"{TEMP_LOG_FILE}.{i}", f"{TEMP_LOG_FILE}.{i + 1}")
+        try:
+            os.link(TEMP_LOG_FILE, f"{TEMP_LOG_FILE}.1")
+        except OSError:
+            shutil.copy2(TEMP_LOG_FILE, f"{TEMP_LOG_FILE}.1")
+
+    atomic_write_json(TEMP_LOG_FILE, data)
+
+
+def log_raw_temperature():
+    """
+    Store raw temperature readings every ~30 minutes with timestamp.
+    """
+    if not SENSE_AVAILABLE:
+        return
+
+    TEMPERATURE_STORE.add(datetime.now().timestamp(), read_temperature())
 
 
 def get_average_temperature_for_location(days=3):
@@ -235,60 +1199,231 @@ def get_average_temperature_for_location(days=3):
     Calculate average temperature for lecture/event period
     over the last N days.
     """
-    if not os.path.exists(TEMP_RAW_LOG_FILE):
+    if not TEMPERATURE_STORE.exists():
         return "No temperature history available."
 
-    with open(TEMP_RAW_LOG_FILE, "r") as f:
-        data = json.load(f)
-
     cutoff = datetime.now().timestamp() - (days * 24 * 3600)
-    temps = []
-
-    for entry in data:
-        ts = entry["timestamp"]
-        t = datetime.fromtimestamp(ts)
+    stats = TEMPERATURE_STORE.hour_window_stats(cutoff, LECTURE_START_HOUR, LECTURE_END_HOUR)
 
-        if ts >= cutoff and LECTURE_START_HOUR <= t.hour < LECTURE_END_HOUR:
-            temps.append(entry["temp"])
-
-    if not temps:
+    if not stats["count"]:
         return "Not enough temperature data for the lecture period."
 
-    avg_temp = round(sum(temps) / len(temps), 2)
+    avg_temp = round(stats["sum"] / stats["count"], 2)
     return f"Average temperature during lecture period (last {days} days): {avg_temp}°C"
 
 
 
-def log_local_temperature():
+def log_local_temperature(samples=None):
     """
     Monitor local temperature every ~30 minutes and update daily min/max.
+    samples: optional batch of (timestamp, temp) pairs; reads the sensor when omitted.
     """
-    if not SENSE_AVAILABLE:
+    if samples is None:
+        if not SENSE_AVAILABLE:
+            return
+        samples = [(datetime.now().timestamp(), read_temperature())]
+
+    if not samples:
         return
 
-    now = datetime.now()
-    today = now.strftime("%Y-%m-%d")
-    temp = round(sense.get_temperature(), 2)
+    with file_lock(TEMP_LOG_FILE):
+        data = load_json_file(TEMP_LOG_FILE, {})
+        _merge_daily_min_max(data, samples)
+        atomic_write_json(TEMP_LOG_FILE, data)
 
-    data = {}
 
-    if os.path.exists(TEMP_LOG_FILE):
-        with open(TEMP_LOG_FILE, "r") as f:
-            data = json.load(f)
+def _merge_daily_min_max(data, samples):
+    for ts, temp in samples:
+        day = datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+        if day not in data:
+            data[day] = {
+                "min": temp,
+                "max": temp,
+                "last_updated": ts
+            }
+        else:
+            data[day]["min"] = min(data[day]["min"], temp)
+            data[day]["max"] = max(data[day]["max"], temp)
+            data[day]["last_updated"] = max(data[day]["last_updated"], ts)
+
+
+# ===============================
+# Background Sensor Sampler
+# ===============================
+SAMPLER_INTERVAL_SECONDS = 60
+SAMPLER_BATCH_SIZE = 10
+
+
+class FakeSensor:
+    """
+    Stand-in for the Sense HAT temperature sensor (tests / machines without a HAT).
+    Replays the given readings in a loop, or returns a constant base value.
+    """
+
+    def __init__(self, readings=None, base=21.0):
+        self.readings = list(readings) if readings else [base]
+        self.calls = 0
+
+    def get_temperature(self):
+        value = self.readings[self.calls % len(self.readings)]
+        self.calls += 1
+        return value
+
+
+SENSOR_MEDIAN_WINDOW = 5     # raw readings per median (drops single-read spikes)
+SENSOR_EMA_ALPHA = 0.3        # weight of the newest median in the moving average
+
+
+class SensorService:
+    """
+    Single owner of the temperature sensor. sample() does the (slow, noisy)
+    I2C read and returns the raw reading, which is what gets stored. It
+    also updates a smoothed value for display only: a median over the last
+    few readings, fed into an exponential moving average. The window counts
+    samples, not time, so it is never stored: at the 30-minute monitor
+    interval it would span hours and flatten the daily min/max.
+    get_temperature() returns the cached smoothed value, last_raw the
+    cached raw reading; neither touches the sensor.
+    """
+
+    def __init__(self, sensor, window=SENSOR_MEDIAN_WINDOW, alpha=SENSOR_EMA_ALPHA):
+        self.sensor = sensor
+        self.alpha = alpha
+        self.raw = collections.deque(maxlen=max(1, window))
+        self.value = None
+        self.last_raw = None
+        self.updated_at = None
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """Read the sensor once, update the smoothed value and return the raw reading."""
+        reading = self.sensor.get_temperature()
+        with self._lock:
+            self.last_raw = reading
+            self.raw.append(reading)
+            median = statistics.median(self.raw)
+            if self.value is None:
+                self.value = median
+            else:
+                self.value = self.alpha * median + (1 - self.alpha) * self.value
+            self.updated_at = time.monotonic()
+            return reading
+
+    def get_temperature(self):
+        """Cached smoothed temperature for displays (None before the first sample). Never touches the sensor."""
+        return self.value
+
+    def age(self):
+        """Seconds since the last sample, or None if never sampled."""
+        if self.updated_at is None:
+            return None
+        return time.monotonic() - self.updated_at
+
+
+def read_temperature(max_age=None):
+    """
+    Latest raw temperature, for anything that is stored (logs, min/max).
+    Served from the sensor service cache; the sensor is only read here when
+    nothing has been sampled yet (or the value is older than max_age), e.g.
+    one-shot CLI runs. Displays use SENSOR_SERVICE.get_temperature() instead.
+    """
+    if SENSOR_SERVICE is None:
+        return None
+
+    age = SENSOR_SERVICE.age()
+    if age is None or (max_age is not None and age > max_age):
+        record_cache("sensor", False)
+        return round(SENSOR_SERVICE.sample(), 2)
+    record_cache("sensor", True)
+    return round(SENSOR_SERVICE.last_raw, 2)
+
+
+class TemperatureSampler(threading.Thread):
+    """
+    Reads the sensor at a fixed interval on a background thread and writes
+    the raw readings to the temperature store in batches. This is the
+    only code path that reads the sensor while the app is running.
+    """
+
+    def __init__(self, sensor, store=None, interval=SAMPLER_INTERVAL_SECONDS,
+                 batch_size=SAMPLER_BATCH_SIZE, on_flush=log_local_temperature,
+                 compact_interval=COMPACTION_INTERVAL_SECONDS):
+        super().__init__(name="temperature-sampler", daemon=True)
+        self.service = sensor if isinstance(sensor, SensorService) else SensorService(sensor)
+        self.store = store if store is not None else TEMPERATURE_STORE
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.on_flush = on_flush
+        self.compact_interval = compact_interval
+        self.pending = []
+        self._stop_event = threading.Event()
+
+    def sample_once(self):
+        self.pending.append((datetime.now().timestamp(), round(self.service.sample(), 2)))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        self.store.add_many(batch)
+        METRICS.inc("terminaltalk_temperature_samples_total", amount=len(batch))
+        if self.on_flush is not None:
+            self.on_flush(batch)
+
+    def run(self):
+        logger = logging.getLogger(__name__)
+        next_tick = time.monotonic()
+        next_compaction = next_tick
+        while not self._stop_event.is_set():
+            try:
+                self.sample_once()
+            except Exception:
+                logger.exception("Temperature sampling failed")
+
+            if self.compact_interval and time.monotonic() >= next_compaction:
+                next_compaction = time.monotonic() + self.compact_interval
+                try:
+                    self.flush()
+                    compact_temperature_logs(self.store)
+                except Exception:
+                    logger.exception("Temperature log compaction failed")
+            # Fixed cadence: schedule from the previous tick, not from "now"
+            next_tick += self.interval
+            self._stop_event.wait(max(0.0, next_tick - time.monotonic()))
+
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Temperature sampler final flush failed")
+
+    def stop(self, timeout=5):
+        """Stop sampling and write out any readings still in the batch."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+        if self.is_alive():
+            # Still inside a sensor read or a write; it flushes on its own way out
+            logging.getLogger(__name__).warning("Temperature sampler did not stop within %ss", timeout)
+            return
+        self.flush()
+
+
+def start_temperature_sampler(interval=SAMPLER_INTERVAL_SECONDS, sensor=None):
+    """Start the background sampler, or return None when no sensor is available."""
+    if sensor is None:
+        if SENSOR_SERVICE is None:
+            return None
+        sensor = SENSOR_SERVICE
+
+    sampler = TemperatureSampler(sensor, interval=interval)
+    sampler.start()
+    return sampler
 
-    if today not in data:
-        data[today] = {
-            "min": temp,
-            "max": temp,
-            "last_updated": now.timestamp()
-        }
-    else:
-        data[today]["min"] = min(data[today]["min"], temp)
-        data[today]["max"] = max(data[today]["max"], temp)
-        data[today]["last_updated"] = now.timestamp()
 
-    with open(TEMP_LOG_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+SENSOR_SERVICE = SensorService(sense) if SENSE_AVAILABLE else None
 
 
 def get_weather_min_max(city: str):
@@ -324,11 +1459,18 @@ def get_last_3_days_temperature_change():
     Return temperature increase/decrease (max-min) per day
     for the last 3 days for both local sensor and weather forecast.
     """
-    if not os.path.exists(TEMP_LOG_FILE):
-        return "No local temperature data available."
+    local_data = {}
+
+    # Daily summary log first, then overwrite with exact values from raw samples
+    with file_lock(TEMP_LOG_FILE):
+        summaries = load_json_file(TEMP_LOG_FILE, {})
+    local_data = {day: (entry["min"], entry["max"]) for day, entry in summaries.items()}
 
-    with open(TEMP_LOG_FILE, "r") as f:
-        local_data = json.load(f)
+    if TEMPERATURE_STORE.exists():
+        local_data.update(TEMPERATURE_STORE.daily_min_max(3))
+
+    if not local_data:
+        return "No local temperature data available."
 
     today = datetime.now().date()
     output = []
@@ -340,8 +1482,7 @@ def get_last_3_days_temperature_change():
         if day_str not in local_data:
             continue
 
-        local_min = local_data[day_str]["min"]
-        local_max = local_data[day_str]["max"]
+        local_min, local_max = local_data[day_str]
         local_diff = round(local_max - local_min, 2)
 
         forecast = get_weather_min_max(DEFAULT_CITY)
@@ -363,22 +1504,30 @@ def get_last_3_days_temperature_change():
     return "\n".join(output)
 
 
-def temperature_monitor_loop():
+def temperature_monitor_loop(interval=MONITOR_INTERVAL_SECONDS):
     """
     Continuous monitoring loop for Raspberry Pi.
     """
+    sampler = start_temperature_sampler(interval)
+    if sampler is None:
+        print(f"{current_time()} Sense HAT not available. Temperature monitoring disabled.")
+        return
+
     try:
-        while True:
-            log_local_temperature()
-            time.sleep(MONITOR_INTERVAL_SECONDS)
+        while sampler.is_alive():
+            sampler.join(1)
     except KeyboardInterrupt:
         print(f"{current_time()} Temperature monitoring stopped.")
+    finally:
+        sampler.stop()
 
 
 
 
 
-QA_DATA = {
+# Initial knowledge base, copied into KB_DB_FILE the first time it is created.
+# Edits (--add/--remove) go to the database, not to this file.
+SEED_QA_DATA = {
     "what is your name?": [
         "I'm TerminalTalk, your terminal assistant!",
         "You can call me TerminalTalk.",
@@ -582,15 +1731,375 @@ TRIVIA_QUESTIONS = [
 ]
 
 
-QUESTION_LIST = None
-QUESTION_EMBEDDINGS = None
+# ===============================
+# Compact String Storage
+# ===============================
+def stable_string_hash(text):
+    """Process-independent 64-bit string hash (str hash() is salted): UTF-8 length and CRC-32."""
+    data = text.encode("utf-8")
+    return (len(data) << 32) | zlib.crc32(data)
 
-""" Return the currently active questions:
-    - If a CSV was imported, use IMPORTED_QA.
-    - Otherwise, use INTERNAL_QA.
-"""
-def known_questions():
-    global IMPORTED_QA, QA_DATA
+
+class StringTable:
+    """
+    Immutable sequence of strings kept as one UTF-8 blob plus a uint64
+    offsets array, instead of one str object per entry. The blob may be
+    bytes or an mmap (strings then start at `base`). Lookups by value go
+    through a sorted array of hashes, built on first use unless passed in
+    (a bundle stores one made with stable_string_hash).
+    """
+
+    __slots__ = ("blob", "offsets", "base", "_hash_fn", "_hashes", "_order")
+
+    LINEAR_SCAN_MAX = 1024  # find_contained_in(): below this many entries a plain scan wins
+
+    def __init__(self, blob, offsets, base=0, hash_fn=hash, hashes=None, order=None):
+        self.blob = blob
+        self.offsets = offsets
+        self.base = base
+        self._hash_fn = hash_fn
+        self._hashes = hashes
+        self._order = order
+
+    @classmethod
+    def from_strings(cls, strings):
+        blob = bytearray()
+        offsets = array.array("Q", [0])
+        for text in strings:
+            blob += text.encode("utf-8")
+            offsets.append(len(blob))
+        return cls(bytes(blob), np.frombuffer(offsets, dtype=np.uint64))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start = self.base + int(self.offsets[i])
+        return self.blob[start:self.base + int(self.offsets[i + 1])].decode("utf-8")
+
+    def __iter__(self):
+        blob, base = self.blob, self.base
+        for start in range(0, len(self), 4096):
+            offs = self.offsets[start:start + 4097].tolist()
+            for a, b in zip(offs, offs[1:]):
+                yield blob[base + a:base + b].decode("utf-8")
+
+    def _build_index(self):
+        hashes = np.fromiter(map(self._hash_fn, self), dtype=np.int64, count=len(self))
+        self._order = np.argsort(hashes, kind="stable").astype(np.uint32)
+        self._hashes = hashes[self._order]
+
+    def hash_index(self):
+        """(sorted hashes, entry positions in that order), built if needed."""
+        if self._hashes is None:
+            self._build_index()
+        return self._hashes, self._order
+
+    def index(self, text):
+        """Position of the first entry equal to text, or -1."""
+        if self._hashes is None:
+            self._build_index()
+        h = self._hash_fn(text)
+        pos = int(np.searchsorted(self._hashes, h))
+        while pos < len(self._hashes) and self._hashes[pos] == h:
+            i = int(self._order[pos])
+            if self[i] == text:
+                return i
+            pos += 1
+        return -1
+
+    def find_containing(self, needle):
+        """Position of the first entry that contains needle, or -1 (one scan of the blob)."""
+        if not len(self):
+            return -1
+        data = needle.encode("utf-8")
+        end = self.base + int(self.offsets[-1])
+        pos = self.blob.find(data, self.base, end)
+        while pos >= 0:
+            i = int(np.searchsorted(self.offsets, pos - self.base, side="right")) - 1
+            if pos - self.base + len(data) <= int(self.offsets[i + 1]):
+                return i
+            # a later hit inside entry i would cross into i + 1 as well
+            pos = self.blob.find(data, self.base + int(self.offsets[i + 1]), end)
+        return -1
+
+    def find_contained_in(self, text):
+        """Position of the first entry that is a substring of text, or -1."""
+        if len(self) <= self.LINEAR_SCAN_MAX:
+            return next((i for i, entry in enumerate(self) if entry and entry in text), -1)
+
+        if self._hashes is None:
+            self._build_index()
+        longest = int(np.diff(self.offsets).max())  # bytes >= characters
+        candidates = list({
+            text[a:b]
+            for a in range(len(text))
+            for b in range(a + 1, min(len(text), a + longest) + 1)
+        })
+        # Hash every candidate, then one searchsorted; only hash hits are compared as strings
+        hashes = np.fromiter(map(self._hash_fn, candidates), dtype=np.int64, count=len(candidates))
+        pos = np.minimum(np.searchsorted(self._hashes, hashes), len(self._hashes) - 1)
+        hits = np.flatnonzero(self._hashes[pos] == hashes)
+        found = [self.index(candidates[k]) for k in hits.tolist()]
+        return min((i for i in found if i >= 0), default=-1)
+
+    def first_substring_match(self, text):
+        """First entry (by position) that equals, contains or is contained in text, or -1."""
+        hits = [i for i in (self.find_containing(text), self.find_contained_in(text)) if i >= 0]
+        return min(hits, default=-1)
+
+
+class CompactQA(collections.abc.Mapping):
+    """
+    In-memory question -> [answers] mapping built from arrays: questions and
+    an interned answer pool as StringTables, and per question a slice
+    qa_start[i]:qa_start[i + 1] of answer ids in refs. Identical answers
+    shared by many questions are stored once.
+    """
+
+    __slots__ = ("questions", "answers", "qa_start", "refs")
+
+    def __init__(self, questions, answers, qa_start, refs):
+        self.questions = questions
+        self.answers = answers
+        self.qa_start = qa_start
+        self.refs = refs
+
+    @classmethod
+    def from_items(cls, items):
+        """Build from (question, answers) pairs; a repeated question keeps its last answers."""
+        slots = {}
+        for question, answers, *_ in items:
+            slots[question] = answers
+
+        pool = {}
+        qa_start = np.zeros(len(slots) + 1, dtype=np.uint64)
+        refs = array.array("I")
+        for i, answers in enumerate(slots.values(), 1):
+            refs.extend(pool.setdefault(a, len(pool)) for a in answers)
+            qa_start[i] = len(refs)
+        return cls(
+            StringTable.from_strings(slots),
+            StringTable.from_strings(pool),
+            qa_start,
+            np.frombuffer(refs, dtype=np.uint32),
+        )
+
+    def answers_at(self, i):
+        refs = self.refs[int(self.qa_start[i]):int(self.qa_start[i + 1])]
+        return [self.answers[int(r)] for r in refs]
+
+    def __getitem__(self, question):
+        i = self.questions.index(question)
+        if i < 0:
+            raise KeyError(question)
+        return self.answers_at(i)
+
+    def __contains__(self, question):
+        return self.questions.index(question) >= 0
+
+    def __iter__(self):
+        return iter(self.questions)
+
+    def __len__(self):
+        return len(self.questions)
+
+
+# ===============================
+# Knowledge Base (SQLite)
+# ===============================
+KB_DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "terminaltalk_kb.sqlite3")
+
+KB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    question TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    answer TEXT NOT NULL,
+    UNIQUE (question_id, answer)
+);
+CREATE INDEX IF NOT EXISTS answers_by_question ON answers(question_id);
+CREATE TABLE IF NOT EXISTS tags (
+    question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (question_id, tag)
+);
+"""
+KB_SEEDED = 1  # PRAGMA user_version once the seed step has run for a database
+
+
+def connect_kb(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(KB_SCHEMA)
+    return conn
+
+
+class SqliteQA(collections.abc.Mapping):
+    """
+    Read-only mapping question -> [answers] over a SQLite knowledge base.
+
+    Only the question keys are loaded (needed for substring matching and
+    embeddings), as a StringTable plus an array of row ids; answers are
+    fetched per question through the indexed question_id. The key cache is
+    refreshed when PRAGMA data_version shows another connection changed
+    the database; each refresh bumps .generation, so cached embeddings of
+    the old key set can be detected as stale.
+
+    The database is opened on first use, not at construction. The seed is
+    applied once, when the database is first created; a knowledge base
+    emptied later with --remove stays empty.
+    """
+
+    def __init__(self, path=KB_DB_FILE, seed=None):
+        self.path = path
+        self.seed = seed
+        self._conn = None
+        self._open_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._index = None       # (StringTable of questions, int64 array of their ids)
+        self._data_version = None
+        self.generation = 0
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            with self._open_lock:
+                if self._conn is None:
+                    conn = self._connect(self.path)
+                    if self.seed and conn.execute("PRAGMA user_version").fetchone()[0] < KB_SEEDED:
+                        with conn:
+                            # A database that already has rows (an import) is only marked.
+                            if conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0] == 0:
+                                for question, answers in self.seed.items():
+                                    self._insert(question, answers, conn)
+                            conn.execute(f"PRAGMA user_version = {KB_SEEDED}")
+                    self._conn = conn
+        return self._conn
+
+    def _connect(self, path):
+        return connect_kb(path)
+
+    def _insert(self, question, answers, conn=None):
+        conn = self.conn if conn is None else conn
+        conn.execute("INSERT OR IGNORE INTO questions(question) VALUES (?)", (question,))
+        qid = conn.execute("SELECT id FROM questions WHERE question = ?", (question,)).fetchone()[0]
+        conn.executemany(
+            "INSERT OR IGNORE INTO answers(question_id, answer) VALUES (?, ?)",
+            [(qid, a) for a in answers]
+        )
+
+    def _load_index(self):
+        with self._lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._index is None or version != self._data_version:
+                ids = array.array("q")
+
+                def questions():
+                    for qid, question in self.conn.execute("SELECT id, question FROM questions ORDER BY id"):
+                        ids.append(qid)
+                        yield question
+
+                table = StringTable.from_strings(questions())
+                self._index = (table, np.frombuffer(ids, dtype=np.int64))
+                self._data_version = version
+                self.generation += 1
+            return self._index
+
+    def _invalidate(self):
+        self._index = None
+
+    def _id_of(self, question):
+        table, ids = self._load_index()
+        i = table.index(question)
+        return None if i < 0 else int(ids[i])
+
+    @property
+    def questions(self):
+        return self._load_index()[0]
+
+    def tags(self, question):
+        """Tags attached to question by a JSONL import ([] if none)."""
+        qid = self._id_of(question)
+        if qid is None:
+            raise KeyError(question)
+        with self._lock:
+            try:
+                rows = self.conn.execute("SELECT tag FROM tags WHERE question_id = ?", (qid,)).fetchall()
+            except sqlite3.OperationalError:
+                return []  # index built before tags existed
+        return [t for (t,) in rows]
+
+    def __getitem__(self, question):
+        qid = self._id_of(question)
+        if qid is None:
+            raise KeyError(question)
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT answer FROM answers WHERE question_id = ? ORDER BY id", (qid,)
+            ).fetchall()
+        return [a for (a,) in rows]
+
+    def __contains__(self, question):
+        return self._id_of(question) is not None
+
+    def __iter__(self):
+        return iter(self.questions)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def add_answers(self, question, answers):
+        """Insert the question if needed plus any new answers; returns how many answers were new."""
+        with self._lock, self.conn:
+            before = self.conn.total_changes
+            self._insert(question, answers)
+            added = self.conn.total_changes - before
+        self._invalidate()
+        return added
+
+    def remove_question(self, question):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM questions WHERE question = ?", (question,))
+        self._invalidate()
+
+    def remove_answers(self, question, answers):
+        """Delete the given answers; drops the question when none are left. Returns answers removed."""
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT id FROM questions WHERE question = ?", (question,)).fetchone()
+            if row is None:
+                return 0
+            removed = self.conn.executemany(
+                "DELETE FROM answers WHERE question_id = ? AND answer = ?",
+                [(row[0], a) for a in answers]
+            ).rowcount
+            left = self.conn.execute("SELECT COUNT(*) FROM answers WHERE question_id = ?", (row[0],)).fetchone()[0]
+            if not left:
+                self.conn.execute("DELETE FROM questions WHERE id = ?", (row[0],))
+        self._invalidate()
+        return removed
+
+
+mark_startup("module setup (Sense HAT, display, data)")
+QA_DATA = SqliteQA(KB_DB_FILE, seed=SEED_QA_DATA)  # opened on first use
+
+QUESTION_LIST = None
+QUESTION_EMBEDDINGS = None
+QUESTION_NORMS = None  # row norms of QUESTION_EMBEDDINGS, computed once per rebuild
+EMBEDDINGS_SOURCE = None  # (id, generation) of the knowledge base the embeddings were built from
+EMBEDDINGS_LOCK = threading.RLock()
+
+""" Return the currently active questions:
+    - If a CSV was imported, use IMPORTED_QA.
+    - Otherwise, use INTERNAL_QA.
+"""
+def known_questions():
+    global IMPORTED_QA
 
     if IMPORTED_QA is not None:
         return IMPORTED_QA
@@ -599,19 +2108,41 @@ def known_questions():
 
 def rebuild_embeddings():
     """Rebuild embeddings for all known questions using fastembed."""
-    global QUESTION_LIST, QUESTION_EMBEDDINGS
+    global QUESTION_LIST, QUESTION_EMBEDDINGS, QUESTION_NORMS, EMBEDDINGS_SOURCE
+
+    with EMBEDDINGS_LOCK:
+        qa = known_questions()
+        table = getattr(qa, "questions", None)
+        QUESTION_LIST = table if isinstance(table, StringTable) else list(qa.keys())
+        EMBEDDINGS_SOURCE = (id(qa), getattr(qa, "generation", None))
+
+        # Imported knowledge bases carry precomputed vectors (row i = question i)
+        precomputed = getattr(qa, "embeddings", None)
+        if precomputed is not None:
+            QUESTION_EMBEDDINGS = precomputed
+        else:
+            # Generate embeddings (one batched call; fastembed splits it internally)
+            QUESTION_EMBEDDINGS = np.array(list(EMBED_MODEL.embed(list(QUESTION_LIST))))
 
-    qa = known_questions()
-    QUESTION_LIST = list(qa.keys())
+        if getattr(qa, "normalized", False):
+            QUESTION_NORMS = np.ones(len(QUESTION_LIST), dtype=np.float32)
+        else:
+            QUESTION_NORMS = np.linalg.norm(QUESTION_EMBEDDINGS, axis=1)
 
-    # Generate embeddings
-    QUESTION_EMBEDDINGS = np.array([
-        next(EMBED_MODEL.embed([q])) for q in QUESTION_LIST
-    ])
+
+def embeddings_stale(qa):
+    """True when there are no embeddings or qa's key set changed since they were built."""
+    getattr(qa, "questions", None)  # SqliteQA re-checks PRAGMA data_version here
+    return QUESTION_EMBEDDINGS is None or (id(qa), getattr(qa, "generation", None)) != EMBEDDINGS_SOURCE
+
+
+def embeddings_snapshot():
+    """(QUESTION_LIST, QUESTION_EMBEDDINGS, QUESTION_NORMS) from one consistent rebuild."""
+    with EMBEDDINGS_LOCK:
+        return QUESTION_LIST, QUESTION_EMBEDDINGS, QUESTION_NORMS
 
 
 IMPORTED_QA = None
-rebuild_embeddings()
 
 
 
@@ -639,16 +2170,12 @@ def safe_import_csv(filepath: str):
             return None
 
         # Check extension
-        if not filepath.lower().endswith(".csv"):
-            print(f"{current_time()} ERROR: Unsupported file type. Only .csv allowed.")
+        if not filepath.lower().endswith(IMPORT_SUFFIXES):
+            print(f"{current_time()} ERROR: Unsupported file type. Only .csv and .jsonl allowed.")
             print(f"{current_time()} Import aborted. Using internal questions.")
             return None
 
-        # Try to open file to check access rights
-        with open(filepath, "r", encoding="utf-8") as f:
-            pass  # we only check whether opening is possible
-
-        # If everything is okay → call the real CSV loader
+        # The loader opens the file exactly once; access/encoding errors surface here
         load_questions_from_csv(filepath)
 
     except PermissionError:
@@ -676,104 +2203,968 @@ def safe_import_csv(filepath: str):
         return None
 
 
-def load_questions_from_csv(filepath: str):
+# ===============================
+# Streaming Import Index
+# ===============================
+IMPORT_CHUNK_SIZE = 512          # rows embedded per batch; bounds import memory
+IMPORT_PROGRESS_EVERY = 20       # chunks between progress lines
+DEDUP_THRESHOLD = 0.92           # cosine at which two questions count as paraphrases
+DEDUP_BLOCK_SIZE = 2048          # rows per similarity tile (tile = block² floats)
+IMPORT_DEDUP_THRESHOLD = None    # --dedup; None = keep every distinct question
+
+IMPORT_META_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class KbFormatError(ValueError):
+    """Import file is readable but not in a usable knowledge-base format."""
+
+
+class CsvFormatError(KbFormatError):
+    """CSV is readable but does not have the columns we need."""
+
+
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+IMPORT_SUFFIXES = (".csv",) + JSONL_SUFFIXES
+
+
+def import_index_paths(source_path):
+    """(sqlite path, vector file path) of the on-disk index built for source_path."""
+    return f"{source_path}.ttindex.sqlite3", f"{source_path}.ttindex.f32"
+
+
+def is_jsonl(filepath):
+    return filepath.lower().endswith(JSONL_SUFFIXES)
+
+
+def iter_kb_rows(filepath):
+    """Rows of an import file, CSV or JSONL depending on its extension."""
+    return iter_jsonl_rows(filepath) if is_jsonl(filepath) else iter_csv_rows(filepath)
+
+
+def csv_header(fieldnames):
+    """CSV header names with surrounding whitespace removed ("question, answer1")."""
+    return [(name or "").strip() for name in fieldnames or []]
+
+
+def answer_columns(fieldnames):
+    """The answerN columns of a CSV header, in numeric order (answer1, answer2, ..., answer12)."""
+    numbered = []
+    for name in fieldnames or []:
+        key = (name or "").strip().lower()
+        if key.startswith("answer") and key[len("answer"):].isdigit():
+            numbered.append((int(key[len("answer"):]), name))
+    return [name for _, name in sorted(numbered)]
+
+
+def iter_csv_rows(filepath):
+    """Yield (question, [answers]) from a Q&A CSV, one row at a time."""
+    with open(filepath, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        reader.fieldnames = csv_header(reader.fieldnames)
+
+        if "question" not in reader.fieldnames:
+            raise CsvFormatError("CSV must contain at least a 'question' column.")
+
+        columns = answer_columns(reader.fieldnames)
+        for row in reader:
+            parsed = parse_qa_row(row, columns)
+            if parsed is not None:
+                yield parsed
+
+
+def iter_jsonl_rows(filepath):
+    """
+    Yield (question, [answers]) or (question, [answers], [tags]) from a
+    JSONL knowledge base, one line at a time:
+        {"question": "...", "answers": ["...", ...], "tags": ["..."]}
+    "answer" (a single string) is accepted instead of "answers", and a
+    single string for "tags". Lines that are not valid records (including
+    tags that are not strings) are logged and skipped.
+    """
     logger = logging.getLogger(__name__)
-    logger.info("Loading CSV file: %s", filepath)
-    global IMPORTED_QA
+    with open(filepath, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning("%s:%d: invalid JSON (%s); line skipped", filepath, lineno, e)
+                continue
+            if not isinstance(record, dict):
+                logger.warning("%s:%d: expected an object; line skipped", filepath, lineno)
+                continue
 
-    if not os.path.exists(filepath):
-        print(f"{current_time()} ERROR: File not found: {filepath}")
-        print(f"{current_time()} Falling back to internal questions.")
-        IMPORTED_QA = None
-        return
+            tags = record.get("tags") or []
+            tags = [tags] if isinstance(tags, str) else tags
+            if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+                logger.warning("%s:%d: tags must be a string or a list of strings; line skipped", filepath, lineno)
+                continue
+            tags = [t.strip() for t in tags if t.strip()]
 
-    qa_dict = {}
-    try:
-        with open(filepath, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
+            answers = record.get("answers", record.get("answer"))
+            parsed = parse_qa_row({"question": record.get("question"), "answers": answers}, ["answers"])
+            if parsed is None:
+                continue
+            yield parsed + (tags,) if tags else parsed
 
-            if not reader.fieldnames or "question" not in reader.fieldnames:
-                print(f"{current_time()} ERROR: CSV must contain at least a 'question' column.")
-                print(f"{current_time()} Falling back to internal questions.")
-                IMPORTED_QA = None
-                return
 
-            for row in reader:
-                question = (row.get("question") or "").strip().lower()
-                if not question:
-                    continue  # skip empty
+def parse_qa_row(row, columns=None):
+    """
+    (question, [answers]) from a DictReader row (or a parsed JSONL record),
+    or None if unusable. A column may hold one answer or a list of them.
+    """
+    question = row.get("question")
+    question = question.strip().lower() if isinstance(question, str) else ""
+    if not question:
+        return None  # skip empty
 
-                answers = []
-                for col in ["answer1", "answer2", "answer3", "answer4"]:
-                    ans = row.get(col)
-                    if ans:
-                        ans = ans.strip()
-                        if ans:
-                            answers.append(ans)
+    if columns is None:
+        columns = answer_columns(row.keys())
 
-                if not answers:
-                    continue
+    answers = []
+    for col in columns:
+        values = row.get(col)
+        for ans in values if isinstance(values, list) else [values]:
+            if isinstance(ans, str) and ans.strip():
+                answers.append(ans.strip())
 
-                qa_dict[question] = answers
+    if not answers:
+        return None
 
-        if not qa_dict:
-            print(f"{current_time()} ERROR: No valid Q&A rows found in CSV.")
-            print(f"{current_time()} Falling back to internal questions.")
-            IMPORTED_QA = None
+    return question, answers
+
+
+def iter_chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def find_near_duplicates(vectors, threshold=DEDUP_THRESHOLD, block_size=DEDUP_BLOCK_SIZE):
+    """
+    canonical[i] = lowest row whose vector is (transitively) within cosine
+    threshold of row i. Similarities are computed tile by tile over the
+    upper triangle, so memory is O(block_size²) instead of O(n²).
+    """
+    n = len(vectors)
+    norms = np.linalg.norm(vectors, axis=1).astype(np.float32)
+    norms[norms == 0] = 1.0
+    parent = np.arange(n)
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def block(start):
+        return np.asarray(vectors[start:start + block_size], dtype=np.float32) / norms[start:start + block_size, None]
+
+    for i0 in range(0, n, block_size):
+        a = block(i0)
+        for j0 in range(i0, n, block_size):
+            b = a if j0 == i0 else block(j0)
+            rows, cols = np.nonzero(a @ b.T >= threshold)
+            rows += i0
+            cols += j0
+            upper = rows < cols
+            for r, c in zip(rows[upper], cols[upper]):
+                r, c = root(r), root(c)
+                if r != c:
+                    parent[max(r, c)] = min(r, c)
+
+    # every link points to a lower row, so repeated jumps reach the roots
+    while True:
+        nxt = parent[parent]
+        if np.array_equal(nxt, parent):
+            return parent
+        parent = nxt
+
+
+class ImportIndexWriter:
+    """
+    Builds an import index chunk by chunk: answers go into a SQLite KB
+    (same schema as KB_DB_FILE), question vectors are appended to a raw
+    float32 file whose row i belongs to question id i + 1. Files are built
+    under temporary names and swapped in by finish(). Questions already in
+    `previous` (an IndexedQA) keep their vectors instead of being re-embedded.
+    """
+
+    def __init__(self, source_path, previous=None):
+        self.db_path, self.vec_path = import_index_paths(source_path)
+        self.tmp_db_path = f"{self.db_path}.tmp"
+        self.tmp_vec_path = f"{self.vec_path}.tmp"
+        for path in (self.tmp_db_path, self.tmp_vec_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+        self.conn = connect_kb(self.tmp_db_path)
+        self.conn.executescript(IMPORT_META_SCHEMA)
+        self.vec_file = open(self.tmp_vec_path, "wb")
+        self.dim = None
+        self.questions = 0
+        self.previous = previous
+        self.reused = 0
+        self.embedded = 0
+
+    def add_chunk(self, rows, vectors=None):
+        """
+        Store a chunk of (question, answers[, tags]); new questions are
+        embedded in one batch unless vectors (one row per item of rows) are
+        supplied.
+        """
+        if vectors is not None:
+            row_of = {row[0]: i for i, row in enumerate(rows)}
+        chunk = {}
+        tags = {}
+        for row in rows:  # later rows win, like the old dict-based import
+            chunk[row[0]] = row[1]
+            tags[row[0]] = row[2] if len(row) > 2 else ()
+
+        placeholders = ",".join("?" * len(chunk))
+        existing = {
+            q: qid for qid, q in self.conn.execute(
+                f"SELECT id, question FROM questions WHERE question IN ({placeholders})", list(chunk)
+            )
+        }
+        new_questions = [q for q in chunk if q not in existing]
+
+        if new_questions:
+            if vectors is None:
+                new_vectors = self._vectors_for(new_questions)
+            else:
+                new_vectors = np.asarray(vectors, dtype=np.float32)[[row_of[q] for q in new_questions]]
+            self.dim = new_vectors.shape[1]
+            self.vec_file.write(new_vectors.tobytes())
+
+        with self.conn:
+            for q, qid in existing.items():
+                self.conn.execute("DELETE FROM answers WHERE question_id = ?", (qid,))
+                self.conn.execute("DELETE FROM tags WHERE question_id = ?", (qid,))
+                self._store(qid, chunk[q], tags[q])
+            for q in new_questions:
+                qid = self.conn.execute("INSERT INTO questions(question) VALUES (?)", (q,)).lastrowid
+                self._store(qid, chunk[q], tags[q])
+        self.questions += len(new_questions)
+
+    def _store(self, qid, answers, tags):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO answers(question_id, answer) VALUES (?, ?)",
+            [(qid, a) for a in answers]
+        )
+        if tags:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO tags(question_id, tag) VALUES (?, ?)",
+                [(qid, t) for t in tags]
+            )
+
+    def _vectors_for(self, questions):
+        known = self.previous.vector_rows(questions) if self.previous is not None else {}
+        missing = [q for q in questions if q not in known]
+        fresh = iter(EMBED_MODEL.embed(missing)) if missing else iter(())
+        self.reused += len(known)
+        self.embedded += len(missing)
+        return np.asarray(
+            [self.previous.embeddings[known[q]] if q in known else next(fresh) for q in questions],
+            dtype=np.float32
+        )
+
+    def merge_near_duplicates(self, threshold):
+        """
+        Fold questions that are near-duplicates of an earlier question into
+        it (answers merged, duplicate dropped) and renumber ids/vector rows
+        so they stay contiguous. Returns [(kept question, duplicate), ...].
+        """
+        if not self.questions:
+            return []
+        self.vec_file.flush()
+        vectors = np.memmap(self.tmp_vec_path, dtype=np.float32, mode="r").reshape(-1, self.dim)
+        canonical = find_near_duplicates(vectors, threshold)
+        rows = np.arange(len(canonical))
+        dup_rows = rows[canonical != rows]
+        if not len(dup_rows):
+            return []
+
+        text = dict(self.conn.execute("SELECT id, question FROM questions"))
+        merged = [(text[int(canonical[r]) + 1], text[int(r) + 1]) for r in dup_rows]
+        keep = rows[canonical == rows]
+
+        with self.conn:
+            for r in dup_rows:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO answers(question_id, answer) "
+                    "SELECT ?, answer FROM answers WHERE question_id = ? ORDER BY id",
+                    (int(canonical[r]) + 1, int(r) + 1)
+                )
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO tags(question_id, tag) SELECT ?, tag FROM tags WHERE question_id = ?",
+                    (int(canonical[r]) + 1, int(r) + 1)
+                )
+                self.conn.execute("DELETE FROM questions WHERE id = ?", (int(r) + 1,))
+
+        # Renumber the survivors 1..k (negative ids avoid primary-key clashes midway)
+        self.conn.execute("PRAGMA foreign_keys=OFF")
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE remap (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)")
+            self.conn.executemany(
+                "INSERT INTO remap(old, new) VALUES (?, ?)",
+                [(int(old) + 1, new) for new, old in enumerate(keep, 1)]
+            )
+            self.conn.execute("UPDATE questions SET id = -(SELECT new FROM remap WHERE old = questions.id)")
+            self.conn.execute("UPDATE questions SET id = -id")
+            self.conn.execute("UPDATE answers SET question_id = (SELECT new FROM remap WHERE old = answers.question_id)")
+            self.conn.execute("UPDATE tags SET question_id = (SELECT new FROM remap WHERE old = tags.question_id)")
+            self.conn.execute("DROP TABLE remap")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+
+        compact_path = f"{self.tmp_vec_path}.dedup"
+        with open(compact_path, "wb") as f:
+            for start in range(0, len(keep), IMPORT_CHUNK_SIZE):
+                f.write(np.ascontiguousarray(vectors[keep[start:start + IMPORT_CHUNK_SIZE]]).tobytes())
+        del vectors
+        self.vec_file.close()
+        os.replace(compact_path, self.tmp_vec_path)
+        self.vec_file = open(self.tmp_vec_path, "ab")
+        self.questions = len(keep)
+        return merged
+
+    def finish(self, meta):
+        meta = dict(meta, dim=self.dim or 0, questions=self.questions, model=EMBED_MODEL_NAME)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)",
+                [(k, json.dumps(v)) for k, v in meta.items()]
+            )
+        # Readers open the finished index read-only; without a WAL they keep
+        # reading the old inode safely when a reload replaces the file.
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.close()
+        self.vec_file.close()
+        os.replace(self.tmp_vec_path, self.vec_path)
+        os.replace(self.tmp_db_path, self.db_path)
+
+    def abort(self):
+        self.conn.close()
+        self.vec_file.close()
+        for path in (self.tmp_db_path, self.tmp_vec_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class IndexedQA(SqliteQA):
+    """Imported knowledge base: SQLite answers plus memory-mapped question vectors."""
+
+    def __init__(self, source_path):
+        db_path, vec_path = import_index_paths(source_path)
+        super().__init__(db_path)
+        self.meta = {k: json.loads(v) for k, v in self.conn.execute("SELECT key, value FROM meta")}
+        dim = self.meta.get("dim", 0)
+        if dim and os.path.getsize(vec_path):
+            self.embeddings = np.memmap(vec_path, dtype=np.float32, mode="r").reshape(-1, dim)
         else:
-            if len(qa_dict) < 10:
-                print(f"{current_time()} WARNING: CSV has only {len(qa_dict)} Q&A pairs (min 10 suggested).")
-            IMPORTED_QA = qa_dict
-            logger.info("CSV loaded: %d questions imported", len(qa_dict))
+            self.embeddings = np.zeros((0, dim or 1), dtype=np.float32)
 
-            print(f"{current_time()} Imported {len(qa_dict)} questions from CSV file: {filepath}")
+    def _connect(self, path):
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
 
-    except Exception as e:
-        print(f"{current_time()} ERROR while reading CSV: {e}")
-        print(f"{current_time()} Falling back to internal questions.")
-        IMPORTED_QA = None
+    def vector_rows(self, questions):
+        """{question: row in self.embeddings} for those of questions in this index."""
+        table, ids = self._load_index()
+        rows = {}
+        for q in questions:
+            i = table.index(q)
+            if i >= 0:
+                rows[q] = int(ids[i]) - 1
+        return rows
+
+
+def source_signature(filepath):
+    st = os.stat(filepath)
+    return {"source_size": st.st_size, "source_mtime_ns": st.st_mtime_ns}
+
+
+def open_import_index(filepath):
+    """Return the existing index for filepath if it is up to date, else None."""
+    db_path, vec_path = import_index_paths(filepath)
+    if not (os.path.exists(db_path) and os.path.exists(vec_path)):
+        return None
+    try:
+        index = IndexedQA(filepath)
+    except (sqlite3.Error, ValueError, json.JSONDecodeError):
+        return None
+
+    meta = index.meta
+    if (
+        any(meta.get(k) != v for k, v in source_signature(filepath).items())
+        or meta.get("model") != EMBED_MODEL_NAME
+        or meta.get("dedup_threshold") != IMPORT_DEDUP_THRESHOLD
+        or len(index.embeddings) != len(index)
+    ):
+        return None
+    return index
 
 
+def dedup_import(writer, threshold, quiet=False):
+    """Run the near-duplicate stage on a finished writer and report what was merged."""
+    if threshold is None:
+        return
+    start = time.perf_counter()
+    merged = writer.merge_near_duplicates(threshold)
+    elapsed = time.perf_counter() - start
+    logging.getLogger(__name__).info(
+        "Near-duplicate merge: %d questions folded (threshold %.2f) in %.2fs", len(merged), threshold, elapsed
+    )
+    for kept, dup in merged:
+        logging.getLogger(__name__).debug("Merged '%s' into '%s'", dup, kept)
+    if quiet:
+        return
+    print(
+        f"{current_time()} Near-duplicate check: merged {len(merged)} questions into "
+        f"{len({kept for kept, _ in merged})} (threshold {threshold:.2f}, {elapsed:.2f}s)"
+    )
+    for kept, dup in merged[:10]:
+        print(f"{current_time()}   '{dup}' -> '{kept}'")
+    if len(merged) > 10:
+        print(f"{current_time()}   ... and {len(merged) - 10} more")
 
 
-def save_qa_to_source(new_qa_dict):
+def build_import_index(filepath, rows, chunk_size=IMPORT_CHUNK_SIZE, previous=None, quiet=False):
     """
-    add a question+answers into INTERNAL_QA inside the .py file.
+    Stream rows into the on-disk index in chunks, printing progress and
+    throughput. Memory use is bounded by chunk_size, not by the file size.
+    With previous (the index being replaced) only new questions are embedded.
     """
-    global QA_DATA
-    QA_DATA = new_qa_dict  # update in-memory dict too
+    logger = logging.getLogger(__name__)
+    signature = source_signature(filepath)
+    writer = ImportIndexWriter(filepath, previous=previous)
+    start = time.perf_counter()
+    seen = 0
+
+    try:
+        for n, chunk in enumerate(iter_chunks(rows, chunk_size), 1):
+            writer.add_chunk(chunk)
+            seen += len(chunk)
+            if n % IMPORT_PROGRESS_EVERY == 0 and not quiet:
+                elapsed = time.perf_counter() - start
+                print(f"{current_time()} Imported {seen} rows ({seen / elapsed:.0f} rows/s)")
+        dedup_import(writer, IMPORT_DEDUP_THRESHOLD, quiet)
+    except BaseException:
+        writer.abort()
+        raise
+
+    writer.finish(dict(signature, dedup_threshold=IMPORT_DEDUP_THRESHOLD))
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "Import index built: %d rows, %d questions (%d embedded, %d reused) in %.2fs",
+        seen, writer.questions, writer.embedded, writer.reused, elapsed
+    )
+    if seen and not quiet:
+        print(f"{current_time()} Indexed {seen} rows in {elapsed:.2f}s ({seen / max(elapsed, 1e-9):.0f} rows/s)")
+    return IndexedQA(filepath)
 
-    import_path = os.path.abspath(__file__)
 
-    with open(import_path, "r", encoding="utf-8") as f:
-        source = f.read()
+# ===============================
+# Parallel Import
+# ===============================
+IMPORT_RANGE_BYTES = 1 << 20     # CSV bytes parsed + embedded per worker task
+
+_WORKER_MODEL = None
+
+
+def csv_byte_ranges(filepath, range_bytes=IMPORT_RANGE_BYTES):
+    """
+    Split a CSV (after its header line) into (start, end) byte ranges that
+    begin and end on line boundaries. Returns (fieldnames, ranges), the
+    names normalized by csv_header() so workers key rows the same way.
+    """
+    size = os.path.getsize(filepath)
+    with open(filepath, "rb") as f:
+        header = f.readline()
+        fieldnames = csv_header(next(csv.reader([header.decode("utf-8")]), []))
+        ranges = []
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + range_bytes, size))
+            if f.tell() < size:
+                f.readline()  # move to the start of the next line
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return fieldnames, ranges
+
+
+def _init_import_worker():
+    global _WORKER_MODEL
+    # One ONNX thread per process: the pool provides the parallelism
+    _WORKER_MODEL = TextEmbedding(EMBED_MODEL_NAME, threads=1)
+
+
+def _import_worker(task):
+    """Parse one byte range and embed its questions (runs in a worker process)."""
+    filepath, fieldnames, start, end = task
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+
+    # strict: a quoted field cut by the range boundary raises instead of corrupting rows
+    reader = csv.DictReader(io.StringIO(text, newline=""), fieldnames=fieldnames, strict=True)
+    columns = answer_columns(fieldnames)
+    rows = [parsed for parsed in (parse_qa_row(row, columns) for row in reader) if parsed is not None]
+
+    questions = list(dict.fromkeys(q for q, _ in rows))
+    latest = dict(rows)
+    rows = [(q, latest[q]) for q in questions]
+    if not questions:
+        return rows, None
+    return rows, np.asarray(list(_WORKER_MODEL.embed(questions)), dtype=np.float32)
+
+
+def parallel_csv_rows_with_vectors(filepath, workers):
+    """
+    Yield (rows, vectors) per byte range, in file order, with parsing and
+    embedding done by a process pool. At most 2 * workers ranges are in
+    flight, so memory stays bounded.
+    """
+    fieldnames, ranges = csv_byte_ranges(filepath)
+    if "question" not in fieldnames:
+        raise CsvFormatError("CSV must contain at least a 'question' column.")
+
+    # Not "fork": the parent runs ONNX and logging threads whose locks a forked child could inherit held
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    tasks = iter([(filepath, fieldnames, start, end) for start, end in ranges])
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=context, initializer=_init_import_worker
+    ) as pool:
+        pending = collections.deque(
+            pool.submit(_import_worker, t) for t in itertools.islice(tasks, 2 * workers)
+        )
+        while pending:
+            rows, vectors = pending.popleft().result()
+            for t in itertools.islice(tasks, 1):
+                pending.append(pool.submit(_import_worker, t))
+            yield rows, vectors
+
+
+def build_import_index_parallel(filepath, workers):
+    """Like build_import_index(), but parsing + embedding run on `workers` processes."""
+    logger = logging.getLogger(__name__)
+    signature = source_signature(filepath)
+    writer = ImportIndexWriter(filepath)
+    start = time.perf_counter()
+    seen = 0
+
+    try:
+        for rows, vectors in parallel_csv_rows_with_vectors(filepath, workers):
+            if rows:
+                writer.add_chunk(rows, vectors)
+            seen += len(rows)
+            elapsed = time.perf_counter() - start
+            print(f"{current_time()} Imported {seen} rows ({seen / max(elapsed, 1e-9):.0f} rows/s, {workers} workers)")
+        dedup_import(writer, IMPORT_DEDUP_THRESHOLD)
+    except BaseException:
+        writer.abort()
+        raise
+
+    writer.finish(dict(signature, dedup_threshold=IMPORT_DEDUP_THRESHOLD))
+    elapsed = time.perf_counter() - start
+    logger.info("Parallel import index built: %d rows, %d questions in %.2fs with %d workers",
+                seen, writer.questions, elapsed, workers)
+    return IndexedQA(filepath)
+
+
+# ===============================
+# Compiled Knowledge-Base Bundle
+# ===============================
+# Layout: header | section table | sections (8-byte aligned).
+# header = magic, version, section count, SHA-256 of everything after the table.
+BUNDLE_MAGIC = b"TTBUNDLE"
+BUNDLE_VERSION = 2
+BUNDLE_HEADER = struct.Struct("<8sII32s")
+BUNDLE_SECTION = struct.Struct("<QQ")   # (offset, length) per section
+BUNDLE_SECTIONS = (
+    "meta",        # JSON: model, dim, counts, source
+    "q_offsets",   # uint64[n_questions + 1] into q_blob
+    "q_blob",      # UTF-8 questions, concatenated
+    "q_hashes",    # int64 stable_string_hash() of every question, sorted
+    "q_order",     # uint32 question positions in q_hashes order
+    "a_offsets",   # uint64[n_answers + 1] into a_blob
+    "a_blob",      # UTF-8 interned (unique) answers, concatenated
+    "qa_start",    # uint64[n_questions + 1] into qa_refs
+    "qa_refs",     # uint32 answer ids, grouped per question
+    "embeddings",  # float32[n_questions, dim], L2-normalized
+    "intents",     # float32[len(LOCATION_INTENT_LABELS), dim], L2-normalized
+)
+
+
+def _normalized(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def compile_bundle(qa_items, output_path, source=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Compile (question, answers) pairs into a versioned single-file bundle:
+    interned strings with offset tables, a pre-normalized embedding matrix,
+    the location intent vectors and a SHA-256 checksum.
+    """
+    qa = CompactQA.from_items(qa_items)  # later rows win
+
+    vectors = [np.asarray(list(EMBED_MODEL.embed(chunk)), dtype=np.float32)
+               for chunk in iter_chunks(qa.questions, chunk_size)]
+    embeddings = _normalized(np.concatenate(vectors)) if vectors else np.zeros((0, 0), dtype=np.float32)
+    intents = _normalized(get_location_intent_embeddings())
+    dim = intents.shape[1]
+    # Lookup index built once here, so opening the bundle never hashes every question
+    q_hashes, q_order = StringTable(qa.questions.blob, qa.questions.offsets, hash_fn=stable_string_hash).hash_index()
+
+    meta = {
+        "model": EMBED_MODEL_NAME,
+        "dim": dim,
+        "questions": len(qa.questions),
+        "answers": len(qa.answers),
+        "intent_labels": LOCATION_INTENT_LABELS,
+        "source": source,
+        "created": datetime.now().isoformat(timespec="seconds"),
+    }
+    payloads = {
+        "meta": json.dumps(meta).encode("utf-8"),
+        "q_offsets": qa.questions.offsets.astype("<u8").tobytes(),
+        "q_blob": qa.questions.blob,
+        "q_hashes": q_hashes.astype("<i8").tobytes(),
+        "q_order": q_order.astype("<u4").tobytes(),
+        "a_offsets": qa.answers.offsets.astype("<u8").tobytes(),
+        "a_blob": qa.answers.blob,
+        "qa_start": qa.qa_start.astype("<u8").tobytes(),
+        "qa_refs": qa.refs.astype("<u4").tobytes(),
+        "embeddings": embeddings.astype("<f4").tobytes(),
+        "intents": intents.astype("<f4").tobytes(),
+    }
 
-    # Find the QA_DATA block start
-    start_idx = source.find("QA_DATA =")
-    if start_idx == -1:
-        print(f"{current_time()} ERROR: 'QA_DATA =' not found in source file.")
+    table_end = BUNDLE_HEADER.size + BUNDLE_SECTION.size * len(BUNDLE_SECTIONS)
+    body = bytearray()
+    table = []
+    for name in BUNDLE_SECTIONS:
+        body.extend(b"\0" * (-(table_end + len(body)) % 8))
+        table.append((table_end + len(body), len(payloads[name])))
+        body.extend(payloads[name])
+
+    checksum = hashlib.sha256(body).digest()
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(BUNDLE_SECTIONS), checksum))
+        for offset, length in table:
+            f.write(BUNDLE_SECTION.pack(offset, length))
+        f.write(body)
+    os.replace(tmp_path, output_path)
+    return meta
+
+
+class BundleQA(CompactQA):
+    """
+    Read-only knowledge base served straight from a memory-mapped bundle.
+    Opening costs a header parse; question lookups binary-search the
+    bundle's hash index in place, and pages are shared by every process
+    that maps the same file. verify=True checks the SHA-256 of the whole body.
+    """
+
+    normalized = True
+
+    def __init__(self, path, verify=False):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n_sections, checksum = BUNDLE_HEADER.unpack_from(self._mm, 0)
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{path} is not a TerminalTalk bundle")
+        if version != BUNDLE_VERSION or n_sections != len(BUNDLE_SECTIONS):
+            raise ValueError(f"Unsupported bundle version {version} in {path} (recompile it with --compile)")
+
+        self.sections = {}
+        for i, name in enumerate(BUNDLE_SECTIONS):
+            offset, length = BUNDLE_SECTION.unpack_from(self._mm, BUNDLE_HEADER.size + i * BUNDLE_SECTION.size)
+            if offset + length > len(self._mm):
+                raise ValueError(f"Truncated bundle: {path}")
+            self.sections[name] = (offset, length)
+
+        if verify:
+            body_start = BUNDLE_HEADER.size + BUNDLE_SECTION.size * len(BUNDLE_SECTIONS)
+            if hashlib.sha256(memoryview(self._mm)[body_start:]).digest() != checksum:
+                raise ValueError(f"Bundle checksum mismatch: {path}")
+
+        self.meta = json.loads(self._bytes("meta").decode("utf-8"))
+        if self.meta["model"] != EMBED_MODEL_NAME:
+            raise ValueError(f"Bundle was built with {self.meta['model']}, runtime uses {EMBED_MODEL_NAME}")
+
+        dim = self.meta["dim"]
+        super().__init__(
+            StringTable(
+                self._mm, self._array("q_offsets", "<u8"), base=self.sections["q_blob"][0],
+                hash_fn=stable_string_hash,
+                hashes=self._array("q_hashes", "<i8"), order=self._array("q_order", "<u4"),
+            ),
+            StringTable(self._mm, self._array("a_offsets", "<u8"), base=self.sections["a_blob"][0]),
+            self._array("qa_start", "<u8"),
+            self._array("qa_refs", "<u4"),
+        )
+        self.embeddings = self._array("embeddings", "<f4").reshape(-1, dim)
+        self.intents = self._array("intents", "<f4").reshape(-1, dim)
+
+    def _bytes(self, name):
+        offset, length = self.sections[name]
+        return self._mm[offset:offset + length]
+
+    def _array(self, name, dtype):
+        offset, length = self.sections[name]
+        return np.frombuffer(self._mm, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=offset)
+
+
+def compile_kb_cli(source_path, output_path):
+    if not os.path.exists(source_path):
+        print(f"{current_time()} ERROR: File path not found: {source_path}")
         return
 
-    # Find the next 'def current_time' (start of next section)
-    end_idx = source.find("def current_time", start_idx)
-    if end_idx == -1:
-        print(f"{current_time()} ERROR: 'def current_time' not found after QA_DATA.")
+    start = time.perf_counter()
+    try:
+        meta = compile_bundle(iter_kb_rows(source_path), output_path, source=os.path.basename(source_path))
+    except KbFormatError as e:
+        print(f"{current_time()} ERROR: {e}")
+        return
+    except (UnicodeDecodeError, csv.Error) as e:
+        logging.getLogger(__name__).warning("Bundle source corrupted or badly encoded: %s (%s)", source_path, e)
+        print(f"{current_time()} ERROR: {source_path} appears corrupted or has invalid encoding.")
+        return
+    BundleQA(output_path, verify=True)
+    print(
+        f"{current_time()} Compiled {meta['questions']} questions / {meta['answers']} unique answers "
+        f"into {output_path} in {time.perf_counter() - start:.2f}s"
+    )
+
+
+def load_bundle(path, verify=False):
+    """Use a compiled bundle as the active knowledge base (and its intent vectors)."""
+    global IMPORTED_QA, LOCATION_INTENT_EMBEDDINGS
+    bundle = BundleQA(path, verify=verify)
+    IMPORTED_QA = bundle
+    LOCATION_INTENT_EMBEDDINGS = bundle.intents
+    invalidate_embeddings()
+    logging.getLogger(__name__).info("Loaded bundle %s (%d questions)", path, len(bundle))
+    return bundle
+
+
+# ===============================
+# Knowledge-Base Hot Reload
+# ===============================
+WATCH_INTERVAL_SECONDS = 1.0     # how often the watched CSV is stat()ed
+
+_PENDING_KB = None
+_PENDING_KB_LOCK = threading.Lock()
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def reload_import_index(filepath, previous=None):
+    """
+    Rebuild the index for filepath, re-embedding only questions that are not
+    in previous. Returns (new index, stats dict).
+    """
+    start = time.perf_counter()
+    index = build_import_index(filepath, iter_kb_rows(filepath), previous=previous, quiet=True)
+    kept = len(previous) if previous is not None else 0
+    reused = len(previous.vector_rows(index)) if previous is not None else 0
+    stats = {
+        "questions": len(index),
+        "added": len(index) - reused,
+        "removed": kept - reused,
+        "ms": (time.perf_counter() - start) * 1000,
+    }
+    return index, stats
+
+
+def apply_pending_kb():
+    """
+    Swap in a knowledge base prepared by KbWatcher. Called from the query
+    loop between questions, so a question never sees half of each index.
+    """
+    global IMPORTED_QA, _PENDING_KB
+    if _PENDING_KB is None:
+        return False
+    with _PENDING_KB_LOCK:
+        pending, _PENDING_KB = _PENDING_KB, None
+    if pending is None:
+        return False
+    IMPORTED_QA = pending
+    invalidate_embeddings()
+    return True
+
+
+class KbWatcher(threading.Thread):
+    """
+    Poll an imported CSV and rebuild its index when it changes. A changed
+    mtime/size only triggers a reload if the content hash changed too; the
+    finished index is handed over through apply_pending_kb().
+    """
+
+    def __init__(self, filepath, interval=WATCH_INTERVAL_SECONDS):
+        super().__init__(name="KbWatcher", daemon=True)
+        self.filepath = filepath
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._stat = self._current_stat()
+        self._hash = file_sha256(filepath) if self._stat else None
+
+    def _current_stat(self):
+        try:
+            st = os.stat(self.filepath)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def check(self):
+        """Reload if the file changed; returns the reload stats or None."""
+        global _PENDING_KB
+        stat = self._current_stat()
+        if stat is None or stat == self._stat:
+            return None
+        self._stat = stat
+
+        digest = file_sha256(self.filepath)
+        if digest == self._hash:
+            return None  # touched, not edited
+
+        logger = logging.getLogger(__name__)
+        with _PENDING_KB_LOCK:
+            previous = _PENDING_KB
+        if previous is None:
+            previous = IMPORTED_QA if isinstance(IMPORTED_QA, IndexedQA) else None
+
+        try:
+            index, stats = reload_import_index(self.filepath, previous)
+        except (OSError, csv.Error, KbFormatError, UnicodeDecodeError, sqlite3.Error) as e:
+            logger.warning("Reload of %s failed: %s", self.filepath, e)
+            return None  # keep serving the current index; retried on the next edit
+
+        self._hash = digest
+        with _PENDING_KB_LOCK:
+            _PENDING_KB = index
+        logger.info(
+            "Reloaded %s: %d questions (+%d new, -%d removed) in %.0f ms",
+            self.filepath, stats["questions"], stats["added"], stats["removed"], stats["ms"]
+        )
+        return stats
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=self.interval + 1)
+
+
+KB_WATCHER = None
+
+
+def start_kb_watcher(filepath, interval=WATCH_INTERVAL_SECONDS):
+    global KB_WATCHER
+    KB_WATCHER = KbWatcher(filepath, interval)
+    KB_WATCHER.start()
+    print(f"{current_time()} Watching {filepath} for changes.")
+    return KB_WATCHER
+
+
+IMPORT_WORKERS = 1  # --import-workers; 1 = sequential streaming import
+
+
+def load_questions_from_csv(filepath: str, workers=None):
+    logger = logging.getLogger(__name__)
+    logger.info("Loading CSV file: %s", filepath)
+    global IMPORTED_QA
+
+    workers = IMPORT_WORKERS if workers is None else workers
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    if not os.path.exists(filepath):
+        print(f"{current_time()} ERROR: File not found: {filepath}")
+        print(f"{current_time()} Falling back to internal questions.")
+        IMPORTED_QA = None
         return
 
-    # Convert dict to pretty text
-    qa_text = json.dumps(new_qa_dict, indent=4, ensure_ascii=False)
+    try:
+        qa_index = open_import_index(filepath)
+        record_cache("import_index", qa_index is not None)
+        if qa_index is None and workers > 1 and not is_jsonl(filepath):
+            try:
+                qa_index = build_import_index_parallel(filepath, workers)
+            except csv.Error as e:
+                # e.g. a quoted field with embedded newlines spanning two ranges
+                logger.warning("Parallel import failed (%s); retrying sequentially", e)
+                print(f"{current_time()} WARNING: Parallel import not possible for this file; importing sequentially.")
+        if qa_index is None:
+            qa_index = build_import_index(filepath, iter_kb_rows(filepath))
+        else:
+            logger.info("Using up-to-date import index for %s", filepath)
 
-    new_block = f"QA_DATA = {qa_text}\n\n"
+        if not len(qa_index):
+            print(f"{current_time()} ERROR: No valid Q&A rows found in {filepath}.")
+            print(f"{current_time()} Falling back to internal questions.")
+            IMPORTED_QA = None
+        else:
+            if len(qa_index) < 10:
+                print(f"{current_time()} WARNING: Import has only {len(qa_index)} Q&A pairs (min 10 suggested).")
+            IMPORTED_QA = qa_index
+            invalidate_embeddings()
+            logger.info("CSV loaded: %d questions imported", len(qa_index))
 
-    before = source[:start_idx]
-    after = source[end_idx:]  # keep the rest of the file
+            print(f"{current_time()} Imported {len(qa_index)} questions from file: {filepath}")
 
-    new_source = before + new_block + after
+    except KbFormatError as e:
+        print(f"{current_time()} ERROR: {e}")
+        print(f"{current_time()} Falling back to internal questions.")
+        IMPORTED_QA = None
+
+    except (PermissionError, UnicodeDecodeError, csv.Error):
+        IMPORTED_QA = None
+        raise  # reported by safe_import_csv
+
+    except Exception as e:
+        print(f"{current_time()} ERROR while reading CSV: {e}")
+        print(f"{current_time()} Falling back to internal questions.")
+        IMPORTED_QA = None
 
-    with open(import_path, "w", encoding="utf-8") as f:
-        f.write(new_source)
 
-    print(f"{current_time()} Internal QA list updated in {os.path.basename(import_path)}.")
+
+
+def invalidate_embeddings():
+    """Drop cached question embeddings; they are rebuilt on next use."""
+    global QUESTION_LIST, QUESTION_EMBEDDINGS, QUESTION_NORMS
+    with EMBEDDINGS_LOCK:
+        QUESTION_LIST = None
+        QUESTION_EMBEDDINGS = None
+        QUESTION_NORMS = None
 
 
 def add_question_cli(question: str, answers: list[str]):
@@ -791,37 +3182,23 @@ def add_question_cli(question: str, answers: list[str]):
         print(f"{current_time()} ERROR: At least one --answer is required when using --add.")
         return
 
-    # Start from current QA_DATA
-    new_qa = dict(QA_DATA)
-
-    # Ensure we have a list for this question
-    existing_answers = list(new_qa.get(q_key, []))
-
-    # Add new answers (avoid duplicates, strip whitespace)
-    added_any = False
-    for ans in answers:
-        ans_clean = ans.strip()
-        if not ans_clean:
-            continue
-        if ans_clean not in existing_answers:
-            existing_answers.append(ans_clean)
-            added_any = True
-
-    if not existing_answers:
+    # Strip whitespace, drop empties and duplicates (keep order)
+    answers_clean = list(dict.fromkeys(a.strip() for a in answers if a.strip()))
+    if not answers_clean:
         print(f"{current_time()} ERROR: No valid answers provided.")
         return
 
-    if q_key in new_qa:
-        if added_any:
-            print(f"{current_time()} Added {len(answers)} answer(s) to existing question: {q_key}")
+    existed = q_key in QA_DATA
+    added = QA_DATA.add_answers(q_key, answers_clean)
+
+    if existed:
+        if added:
+            print(f"{current_time()} Added {added} answer(s) to existing question: {q_key}")
         else:
             print(f"{current_time()} No new answers added (all duplicates) for question: {q_key}")
     else:
         print(f"{current_time()} Created new question: {q_key}")
-
-    new_qa[q_key] = existing_answers
-    save_qa_to_source(new_qa)
-    rebuild_embeddings()
+        invalidate_embeddings()
 
 
 
@@ -836,52 +3213,327 @@ def remove_question_cli(question: str, answers: list[str] | None = None):
         print(f"{current_time()} ERROR: Question text is empty.")
         return
 
-    new_qa = dict(QA_DATA)
-
-    if q_key not in new_qa:
+    if q_key not in QA_DATA:
         print(f"{current_time()} Question not found: {q_key}")
         return
 
     # If no answers given → remove whole question
     if not answers:
-        del new_qa[q_key]
+        QA_DATA.remove_question(q_key)
         print(f"{current_time()} Removed entire question: {q_key}")
-        save_qa_to_source(new_qa)
+        invalidate_embeddings()
         return
 
-    # Remove specific answers
-    existing_answers = list(new_qa[q_key])
-    original_count = len(existing_answers)
-
-    # Remove all matches
-    for ans in answers:
-        ans_clean = ans.strip()
-        existing_answers = [a for a in existing_answers if a != ans_clean]
-
-    removed_count = original_count - len(existing_answers)
+    removed_count = QA_DATA.remove_answers(q_key, [a.strip() for a in answers])
 
     if removed_count == 0:
         print(f"{current_time()} No matching answers found to remove for question: {q_key}")
         return
 
-    if not existing_answers:
-        # No answers left → optionally remove whole question
+    if q_key not in QA_DATA:
+        # No answers left → whole question removed
         print(f"{current_time()} All answers removed; deleting question: {q_key}")
-        del new_qa[q_key]
+        invalidate_embeddings()
     else:
-        new_qa[q_key] = existing_answers
         print(f"{current_time()} Removed {removed_count} answer(s) from question: {q_key}")
 
-    save_qa_to_source(new_qa)
-    rebuild_embeddings()
 
 
+# ===============================
+# Latency Instrumentation
+# ===============================
+LATENCY_ENABLED = False  # --latency-stats; spans cost one global check when off
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds); percentiles are bucket upper bounds."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+LATENCY_STATS = collections.defaultdict(LatencyHistogram)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        LATENCY_STATS[self.name].observe((time.perf_counter() - self.start) * 1000)
+        return False
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(name):
+    """Context manager timing one stage into LATENCY_STATS[name] (no-op unless enabled)."""
+    return _Span(name) if LATENCY_ENABLED else _NO_SPAN
+
+
+def format_latency_stats():
+    if not LATENCY_ENABLED:
+        return "Latency stats are off (start with --latency-stats)."
+    if not LATENCY_STATS:
+        return "No latency samples yet."
+    lines = [f"{'stage':<28}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+    for name in sorted(LATENCY_STATS):
+        h = LATENCY_STATS[name]
+        lines.append(
+            f"{name:<28}{h.count:>7}{h.total / h.count:>10.2f}{h.percentile(50):>10.2f}"
+            f"{h.percentile(95):>10.2f}{h.percentile(99):>10.2f}{h.max:>10.2f}"
+        )
+    return "Latency per stage:\n" + "\n".join(lines)
+
+
+# ===============================
+# Metrics (Prometheus text format)
+# ===============================
+METRICS_TEXTFILE_INTERVAL_SECONDS = 15
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.45, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+METRIC_DEFINITIONS = {
+    # name: (type, help, histogram buckets)
+    "terminaltalk_questions_total": ("counter", "Questions answered, by match type.", None),
+    "terminaltalk_answer_seconds": ("histogram", "Time to answer one question.", SECONDS_BUCKETS),
+    "terminaltalk_semantic_score": ("histogram", "Best cosine score of semantic searches.", SCORE_BUCKETS),
+    "terminaltalk_model_seconds": ("histogram", "Embedding model latency per call.", SECONDS_BUCKETS),
+    "terminaltalk_cache_hits_total": ("counter", "Cache lookups served from the cache.", None),
+    "terminaltalk_cache_misses_total": ("counter", "Cache lookups that had to compute the value.", None),
+    "terminaltalk_weather_failures_total": ("counter", "Weather API calls that returned no data.", None),
+    "terminaltalk_temperature_samples_total": ("counter", "Temperature samples stored by the sampler.", None),
+}
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms sharded per thread: an update only touches the
+    calling thread's own dict (no lock), and collect() sums the shards. The
+    registry lock is taken once per thread, when its shard is created.
+    Shards of finished threads (one per request under --serve) are folded
+    into a base total whenever a shard is created or collected, so the
+    shard list stays as long as the number of live threads.
+    """
+
+    def __init__(self, definitions=METRIC_DEFINITIONS):
+        self.definitions = definitions
+        self._local = threading.local()
+        self._shards = []   # (weakref to owning thread, shard)
+        self._base = {}     # totals of folded shards
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._fold_dead_shards()
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+
+    def _fold_dead_shards(self):
+        """Merge shards whose thread has exited into _base (registry lock held)."""
+        live = []
+        for ref, shard in self._shards:
+            thread = ref()
+            if thread is not None and thread.is_alive():
+                live.append((ref, shard))
+            else:
+                self._merge(self._base, shard)  # its thread can no longer write to it
+        self._shards = live
+
+    @staticmethod
+    def _merge(totals, shard):
+        for key, value in list(shard.items()):
+            if isinstance(value, list):
+                acc = totals.setdefault(key, [0] * (len(value) - 1) + [0.0])
+                for i, v in enumerate(value):
+                    acc[i] += v
+            else:
+                totals[key] = totals.get(key, 0) + value
+
+    def inc(self, name, labels=(), amount=1):
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        shard = self._shard()
+        key = (name, labels)
+        h = shard.get(key)
+        if h is None:
+            # [count per bucket..., +Inf count, sum]
+            h = shard[key] = [0] * (len(self.definitions[name][2]) + 1) + [0.0]
+        h[bisect.bisect_left(self.definitions[name][2], value)] += 1
+        h[-1] += value
+
+    def collect(self):
+        """{(name, labels): total} for counters, {(name, labels): [buckets..., sum]} for histograms."""
+        totals = {}
+        with self._lock:
+            self._fold_dead_shards()
+            self._merge(totals, self._base)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            self._merge(totals, shard)
+        return totals
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        totals = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in self.definitions.items():
+            series = sorted((labels, v) for (n, labels), v in totals.items() if n == name)
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in series:
+                if kind != "histogram":
+                    lines.append(f"{name}{_prom_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ["+Inf"], value[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_prom_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_prom_labels(labels)} {value[-1]}")
+                lines.append(f"{name}_count{_prom_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _prom_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+METRICS = MetricsRegistry()
+
+
+def record_cache(cache, hit):
+    METRICS.inc("terminaltalk_cache_hits_total" if hit else "terminaltalk_cache_misses_total", (("cache", cache),))
+
+
+def embed_query(text, purpose="query"):
+    """Embed one text with EMBED_MODEL, recording the model latency."""
+    start = time.perf_counter()
+    vec = next(EMBED_MODEL.embed([text]))
+    METRICS.observe("terminaltalk_model_seconds", time.perf_counter() - start, (("purpose", purpose),))
+    return vec
+
+
+def write_metrics_textfile(path):
+    """Atomically rewrite path for node_exporter's textfile collector."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(METRICS.render())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class MetricsTextfileWriter(threading.Thread):
+    def __init__(self, path, interval=METRICS_TEXTFILE_INTERVAL_SECONDS):
+        super().__init__(name="MetricsTextfileWriter", daemon=True)
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                write_metrics_textfile(self.path)
+            except OSError as e:
+                logging.getLogger(__name__).warning("Could not write metrics to %s: %s", self.path, e)
+            if self._stop_event.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=5)
+        write_metrics_textfile(self.path)  # final values
+
 
 SIMILARITY_THRESHOLD = 0.45  # tune as needed (0.5–0.6 is good)
 
+
+def find_substring_key(qa, q):
+    """First known question (in key order) that equals, contains or is contained in q."""
+    table = getattr(qa, "questions", None)
+    if isinstance(table, StringTable):
+        i = table.first_substring_match(q)
+        return None if i < 0 else table[i]
+
+    for key in qa:
+        if key == q or key in q or q in key:
+            return key
+    return None
+
+
 def get_answer(question):
+    return answer_question(question)[0]
+
+
+def answer_question(question):
+    """(answer, match) where match is how it was found: 'substring', 'semantic' or 'none'."""
+    start = time.perf_counter()
+    with span("answer.total"):
+        answer, match = _get_answer(question)
+    METRICS.inc("terminaltalk_questions_total", (("match", match),))
+    METRICS.observe("terminaltalk_answer_seconds", time.perf_counter() - start)
+    return answer, match
+
+
+def _location_enrichment():
+    with span("answer.weather"):
+        weather = fetch_weather(DEFAULT_CITY)
+    with span("answer.temperature_log"):
+        avg_temp = get_average_temperature_for_location(3)
+    return weather, avg_temp
+
+
+def _get_answer(question):
     logger = logging.getLogger(__name__)
-    global QUESTION_LIST, QUESTION_EMBEDDINGS
     logger.debug("get_answer() called with: %s", question)
     logger.info("Received question: %s", question)
 
@@ -889,86 +3541,109 @@ def get_answer(question):
     qa_dict = known_questions()
 
     # 1) Exact or substring match (old behavior preserved)
-    for key, answers in qa_dict.items():
-        if key == q or key in q or q in key:
-            logger.debug("Exact/substring match found. Key='%s', Selected Answer='%s'", key, random.choice(answers))
-            # return random.choice(answers)
-            base_answer = random.choice(answers)
+    with span("answer.substring"):
+        key = find_substring_key(qa_dict, q)
+    answers = qa_dict.get(key) if key is not None else None
+    if answers:
+        base_answer = random.choice(answers)
+        logger.debug("Exact/substring match found. Key='%s', Selected Answer='%s'", key, base_answer)
 
-            if is_location_question_semantic(question):
-                weather = fetch_weather(DEFAULT_CITY)
-                avg_temp = get_average_temperature_for_location(3)
-                return f"{base_answer}\n\n{weather} \n {avg_temp}"
+        with span("answer.location_intent"):
+            is_location = is_location_question_semantic(question)
+        if is_location:
+            weather, avg_temp = _location_enrichment()
+            return f"{base_answer}\n\n{weather} \n {avg_temp}", "substring"
 
-            return base_answer
+        return base_answer, "substring"
 
 
     # 2) Semantic fastembed match
-    if QUESTION_EMBEDDINGS is None:
-        logger.debug("Embeddings not loaded. Rebuilding embeddings.")
-        rebuild_embeddings()
+    if embeddings_stale(qa_dict):
+        # Not built yet, or another process changed the knowledge base
+        logger.debug("Embeddings missing or stale. Rebuilding embeddings.")
+        with span("answer.rebuild_embeddings"):
+            rebuild_embeddings()
+    question_list, embeddings, norms = embeddings_snapshot()
 
     # Embed user question
-    user_vec = next(EMBED_MODEL.embed([q]))
+    with span("answer.embed_query"):
+        user_vec = embed_query(q)
 
     # Compute cosine similarity
-    scores = QUESTION_EMBEDDINGS @ user_vec / (
-        np.linalg.norm(QUESTION_EMBEDDINGS, axis=1) * np.linalg.norm(user_vec)
-    )
+    with span("answer.similarity"):
+        scores = embeddings @ user_vec / (
+            norms * np.linalg.norm(user_vec)
+        )
 
-    best_idx = np.argmax(scores)
-    best_score = scores[best_idx]
-    best_question = QUESTION_LIST[best_idx]
+        best_idx = np.argmax(scores)
+        best_score = scores[best_idx]
+        best_question = question_list[best_idx]
 
-    logger.debug("Semantic search: Best match='%s', Score=%.3f", best_question, best_score)
+    logger.debug("Semantic search: Best match='%s', Score=%.3f", best_question, float(best_score))
+    METRICS.observe("terminaltalk_semantic_score", float(best_score))
 
-    if best_score >= SIMILARITY_THRESHOLD:
-        logger.debug("Semantic match accepted. Selected Answer='%s'", random.choice(qa_dict[best_question]))
+    # A question removed since the embeddings were built counts as no match
+    answers = qa_dict.get(best_question) if best_score >= SIMILARITY_THRESHOLD else None
+    if answers:
+        base_answer = random.choice(answers)
+        logger.debug("Semantic match accepted. Selected Answer='%s'", base_answer)
         logger.info("Semantic match: '%s' -> '%s' (score=%.3f)", question, best_question, best_score)
-        # return random.choice(qa_dict[best_question])
-        base_answer = random.choice(qa_dict[best_question])
 
-    if is_location_question_semantic(question):
-        weather = fetch_weather(DEFAULT_CITY)
-        avg_temp = get_average_temperature_for_location(3)
+        with span("answer.location_intent"):
+            is_location = is_location_question_semantic(question)
+        if is_location:
+            weather, avg_temp = _location_enrichment()
 
-        return (
-            f"{base_answer}\n\n"
-            f"{weather}\n"
-            f"{avg_temp}"
-        )
+            return (
+                f"{base_answer}\n\n"
+                f"{weather}\n"
+                f"{avg_temp}"
+            ), "semantic"
 
 
     logger.warning("No match found for question: %s", question)
-    return "Sorry, I don't recognize that question."
+    return "Sorry, I don't recognize that question.", "none"
 
 
 def semantic_suggestions(keyword, top_k=5):
     """Return top-k similar known questions based on a short keyword."""
-    global QUESTION_LIST, QUESTION_EMBEDDINGS
-    if QUESTION_EMBEDDINGS is None:
-        rebuild_embeddings()
+    with span("suggest.total"):
+        return _semantic_suggestions(keyword, top_k)
+
+
+def _semantic_suggestions(keyword, top_k):
+    if embeddings_stale(known_questions()):
+        with span("suggest.rebuild_embeddings"):
+            rebuild_embeddings()
+    question_list, embeddings, norms = embeddings_snapshot()
 
     # Embed keyword
-    key_vec = next(EMBED_MODEL.embed([keyword]))
+    with span("suggest.embed_query"):
+        key_vec = embed_query(keyword, "suggestion")
 
     # Compute cosine similarity with all questions
-    scores = QUESTION_EMBEDDINGS @ key_vec / (
-        np.linalg.norm(QUESTION_EMBEDDINGS, axis=1) * np.linalg.norm(key_vec)
-    )
+    with span("suggest.similarity"):
+        scores = embeddings @ key_vec / (
+            norms * np.linalg.norm(key_vec)
+        )
 
-    # Top K results
-    top_indices = np.argsort(scores)[::-1][:top_k]
+        # Top K results
+        top_indices = np.argsort(scores)[::-1][:top_k]
 
     suggestions = []
     for idx in top_indices:
         if scores[idx] > 0.45:  # lower threshold for suggestions
-            suggestions.append(QUESTION_LIST[idx])
+            suggestions.append(question_list[idx])
 
     return suggestions
 
 def split_compound_question(text):
     """Split multiple questions based on connectors."""
+    with span("compound.split"):
+        return _split_compound_question(text)
+
+
+def _split_compound_question(text):
     t = text.lower().strip()
 
     connectors = [" and ", " & ", " also ", " plus ", ", then "]
@@ -979,17 +3654,40 @@ def split_compound_question(text):
     return parts
 
 
-def chat_mode():
-    show_symbol(START_SYMBOL)
+def chat_mode(sample_interval=SAMPLER_INTERVAL_SECONDS, idle_delay=IDLE_DISPLAY_DELAY_SECONDS):
+    sampler = start_temperature_sampler(sample_interval)
+    idle_display = IdleTemperatureDisplay(idle_delay) if SENSE_AVAILABLE else None
+    try:
+        _chat_loop(idle_display)
+    finally:
+        if idle_display is not None:
+            idle_display.disarm()
+        if sampler is not None:
+            sampler.stop()
+
+
+def _read_input(prompt, idle_display=None):
+    """input() with the idle LED display running only while we wait."""
+    if idle_display is None:
+        return input(prompt)
+
+    idle_display.arm()
+    try:
+        return input(prompt)
+    finally:
+        idle_display.disarm()
+
+
+def _chat_loop(idle_display=None):
+    show_symbol(FRAME_CACHE["start"])
     print(f"{current_time()} Hello!")
     time.sleep(1)
     print(f"{current_time()} How can I help you? (Type 'bye' to exit)")
     suggestions = None
-    show_temperature_idle()
 
     while True:
-        log_raw_temperature()
-        user_input = input(f"{current_time()} ").strip()
+        user_input = _read_input(f"{current_time()} ", idle_display).strip()
+        apply_pending_kb()
 
         if user_input.lower() == "bye":
             print(f"{current_time()} Goodbye!")
@@ -999,8 +3697,12 @@ def chat_mode():
             print(f"{current_time()} You can ask about:\n" + "\n".join(known_questions().keys()))
             continue
 
+        if user_input.lower() == "stats":
+            print(f"{current_time()} {format_latency_stats()}")
+            continue
+
         if user_input.lower() == "trivia":
-            show_symbol(GAME_START_SYMBOL)
+            show_symbol(FRAME_CACHE["game_start"])
             trivia_game()
             print(f"{current_time()} Trivia finished. Resuming normal chat...\n")
             continue    
@@ -1019,9 +3721,10 @@ def chat_mode():
         # compound question detection
         parts = split_compound_question(user_input)
         if len(parts) > 1:
-            for p in parts:
-                print(f"{current_time()} Q: {p}")
-                print(f"{current_time()} A: {get_answer(p)}")
+            with span("compound.total"):
+                for p in parts:
+                    print(f"{current_time()} Q: {p}")
+                    print(f"{current_time()} A: {get_answer(p)}")
             continue
 
         # keyword suggestion mode
@@ -1045,6 +3748,135 @@ def direct_mode(question):
     print(f"{current_time()} {get_answer(question)}")
 
 
+def batch_mode(infile=None, outfile=None):
+    """
+    Answer one question per input line; write one JSON object per line
+    ({"question", "answer", "match"}), flushed immediately so a driving
+    process can use it as a request/response pipe.
+    """
+    infile = sys.stdin if infile is None else infile
+    outfile = sys.stdout if outfile is None else outfile
+    for line in infile:
+        question = line.strip()
+        if not question:
+            continue
+        if apply_pending_kb():
+            rebuild_embeddings()
+        answer, match = answer_question(question)
+        outfile.write(json.dumps({"question": question, "answer": answer, "match": match}) + "\n")
+        outfile.flush()
+
+
+# ===============================
+# Server Mode
+# ===============================
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+
+
+class AnswerGate:
+    """Any number of concurrent answers, or one knowledge-base swap, never both."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+
+    @contextlib.contextmanager
+    def answering(self):
+        with self._cond:
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def swapping(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._readers == 0)
+            yield
+
+
+ANSWER_GATE = AnswerGate()
+
+
+def serve_answer(question):
+    """answer_question() for concurrent server requests; picks up hot-reloaded KBs first."""
+    if _PENDING_KB is not None:
+        with ANSWER_GATE.swapping():
+            if apply_pending_kb():
+                rebuild_embeddings()
+    with ANSWER_GATE.answering():
+        return answer_question(question)
+
+
+class TerminalTalkRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    GET  /ask?q=...            -> {"question", "answer", "match"}
+    POST /ask {"question": ..} -> same
+    GET  /metrics              -> Prometheus text format
+    GET  /healthz              -> ok
+    """
+
+    server_version = "TerminalTalk"
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == "/metrics":
+            self._send(200, METRICS.render(), "text/plain; version=0.0.4; charset=utf-8")
+        elif url.path == "/healthz":
+            self._send(200, "ok\n", "text/plain")
+        elif url.path == "/ask":
+            self._answer(urllib.parse.parse_qs(url.query).get("q", [""])[0])
+        else:
+            self._send(404, "not found\n", "text/plain")
+
+    def do_POST(self):
+        if urllib.parse.urlsplit(self.path).path != "/ask":
+            self._send(404, "not found\n", "text/plain")
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            question = json.loads(self.rfile.read(length) or b"{}")["question"]
+        except (ValueError, KeyError, TypeError):
+            self._send(400, json.dumps({"error": "expected JSON body {\"question\": ...}"}), "application/json")
+            return
+        self._answer(question)
+
+    def _answer(self, question):
+        if not isinstance(question, str) or not question.strip():
+            self._send(400, json.dumps({"error": "empty question"}), "application/json")
+            return
+        answer, match = serve_answer(question)
+        self._send(200, json.dumps({"question": question, "answer": answer, "match": match}), "application/json")
+
+    def _send(self, status, body, content_type):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug("HTTP %s " + format, self.address_string(), *args)
+
+
+def serve_mode(host=SERVER_HOST, port=SERVER_PORT):
+    server = http.server.ThreadingHTTPServer((host, port), TerminalTalkRequestHandler)
+    server.daemon_threads = True
+    print(f"{current_time()} Serving on http://{host}:{server.server_address[1]} (/ask, /metrics). Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"{current_time()} Server stopped.")
+    finally:
+        server.server_close()
+
+
 class CustomArgumentParser(argparse.ArgumentParser):
     def error(self, message):
         # Called when user passes unknown or invalid arguments
@@ -1052,15 +3884,371 @@ class CustomArgumentParser(argparse.ArgumentParser):
         self.print_help()   # show help text
         exit(2)             # exit instead of running chat mode
 
-def trivia_game():
+# ===============================
+# Trivia Banks
+# ===============================
+TRIVIA_BANK_FILE = None            # CSV/JSONL bank set with --trivia-bank; None = built-in questions
+TRIVIA_STATE_FILE = "trivia_state.json"
+TRIVIA_INDEX_MAGIC = 0x5454494458303031  # "TTIDX001"
+OPTION_LETTERS = "ABCD"
+
+
+def normalize_trivia_item(question, options, correct):
+    """Return a TRIVIA_QUESTIONS-style dict; options get "A. " prefixes if missing."""
+    options = [str(o).strip() for o in options]
+    if len(options) != len(OPTION_LETTERS):
+        raise ValueError(f"Trivia question needs {len(OPTION_LETTERS)} options: {question}")
+    options = [
+        o if o[:3] == f"{letter}. " else f"{letter}. {o}"
+        for letter, o in zip(OPTION_LETTERS, options)
+    ]
+    return {"question": question.strip(), "options": options, "correct": str(correct).strip().upper()}
+
+
+class ListTriviaBank:
+    """Trivia bank over an in-memory list (the built-in TRIVIA_QUESTIONS)."""
+
+    def __init__(self, items, bank_id="builtin"):
+        self.items = items
+        self.bank_id = bank_id
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FileTriviaBank:
+    """
+    Trivia bank in a CSV (question,A,B,C,D,correct) or JSONL
+    ({"question", "options", "correct"}) file, read one item at a time.
+
+    A sidecar "<path>.idx" stores the byte offset of every item, so opening
+    a bank of any size is a stat() plus a memory map, and item i is one seek.
+    The index is rebuilt only when the bank file's size or mtime changes.
+    CSV rows must not contain embedded newlines.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.bank_id = os.path.abspath(path)
+        self.is_jsonl = path.lower().endswith((".jsonl", ".ndjson"))
+        self.columns = None
+        self.offsets = self._load_index()
+        self._file = open(path, "rb")
+
+    def _stat_key(self):
+        st = os.stat(self.path)
+        return st.st_size, st.st_mtime_ns
+
+    def _load_index(self):
+        idx_path = f"{self.path}.idx"
+        size, mtime_ns = self._stat_key()
+
+        if os.path.exists(idx_path):
+            index = np.memmap(idx_path, dtype="<u8", mode="r")
+            if index.size >= 3 and tuple(index[:3]) == (TRIVIA_INDEX_MAGIC, size, mtime_ns):
+                if not self.is_jsonl:
+                    self._read_header()
+                return index[3:]
+
+        offsets = self._scan_offsets()
+        header = np.array([TRIVIA_INDEX_MAGIC, size, mtime_ns], dtype="<u8")
+        tmp_path = f"{idx_path}.tmp"
+        np.concatenate((header, np.asarray(offsets, dtype="<u8"))).tofile(tmp_path)
+        os.replace(tmp_path, idx_path)
+        return np.memmap(idx_path, dtype="<u8", mode="r")[3:]
+
+    def _read_header(self):
+        with open(self.path, "r", encoding="utf-8", newline="") as f:
+            header = next(csv.reader(f), [])  # empty file: no columns, no items
+        self.columns = [c.strip().lower() for c in header]
+
+    def _scan_offsets(self):
+        offsets = array.array("Q")
+        with open(self.path, "rb") as f:
+            if not self.is_jsonl:
+                self._read_header()
+                f.readline()
+            pos = f.tell()
+            for line in f:
+                if line.strip():
+                    offsets.append(pos)
+                pos += len(line)
+        return offsets
+
+    def __len__(self):
+        return int(self.offsets.size)
+
+    def __getitem__(self, i):
+        self._file.seek(int(self.offsets[i]))
+        line = self._file.readline().decode("utf-8")
+
+        if self.is_jsonl:
+            row = json.loads(line)
+            return normalize_trivia_item(row["question"], row["options"], row["correct"])
+
+        row = dict(zip(self.columns, next(csv.reader([line]))))
+        options = [row.get(letter.lower(), "") for letter in OPTION_LETTERS]
+        return normalize_trivia_item(row["question"], options, row["correct"])
+
+    def close(self):
+        """Close the bank file handle used for item reads."""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LazyPermutation:
+    """
+    Pseudo-random permutation of range(n) evaluated one index at a time:
+    a 4-round Feistel network over the next power-of-4 domain, with cycle
+    walking to stay below n. O(1) memory and setup regardless of n.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, n, seed):
+        self.n = n
+        self.seed = seed
+        self.half_bits = max(1, (max(n, 2) - 1).bit_length() + 1) // 2
+        self.mask = (1 << self.half_bits) - 1
+
+    def _round(self, value, r):
+        digest = hashlib.blake2b(
+            f"{self.seed}:{r}:{value}".encode(), digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "little") & self.mask
+
+    def _feistel(self, x):
+        left, right = x >> self.half_bits, x & self.mask
+        for r in range(self.ROUNDS):
+            left, right = right, left ^ self._round(right, r)
+        return (left << self.half_bits) | right
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.n:
+            raise IndexError(i)
+        x = self._feistel(i)
+        while x >= self.n:
+            x = self._feistel(x)
+        return x
+
+
+TRIVIA_ITEM_ERRORS = (ValueError, KeyError, TypeError, IndexError, csv.Error)
+
+
+class TriviaSampler:
+    """
+    Draws bank items without replacement across sessions. Progress through
+    the current permutation is persisted per bank in TRIVIA_STATE_FILE;
+    once every item has been asked, a new permutation starts. Malformed
+    items are logged and skipped.
+    """
+
+    def __init__(self, bank, state_file=None):
+        self.bank = bank
+        self.state_file = state_file if state_file is not None else TRIVIA_STATE_FILE
+        all_state = load_json_file(self.state_file, {})
+        state = all_state.get(bank.bank_id)
+
+        if not state or state.get("size") != len(bank) or state.get("position", 0) >= len(bank):
+            state = {"seed": random.getrandbits(63), "position": 0, "size": len(bank)}
+        self.state = state
+        self.permutation = LazyPermutation(len(bank), state["seed"])
+
+    def next(self):
+        """Next valid item, or None if a full fresh pass finds none."""
+        # The rest of this pass plus one whole new pass covers every item.
+        for _ in range(2 * len(self.bank) - min(self.state["position"], len(self.bank))):
+            if self.state["position"] >= len(self.bank):
+                self.state = {"seed": random.getrandbits(63), "position": 0, "size": len(self.bank)}
+                self.permutation = LazyPermutation(len(self.bank), self.state["seed"])
+
+            i = self.permutation[self.state["position"]]
+            self.state["position"] += 1
+            try:
+                return self.bank[i]
+            except TRIVIA_ITEM_ERRORS as e:
+                logging.getLogger(__name__).warning(
+                    "Skipping malformed trivia item %d in %s: %s", i, self.bank.bank_id, e
+                )
+        return None
+
+    def save(self):
+        with file_lock(self.state_file):
+            all_state = load_json_file(self.state_file, {})
+            all_state[self.bank.bank_id] = self.state
+            atomic_write_json(self.state_file, all_state)
+
+
+TRIVIA_GENERATED_FILE = "trivia_generated.jsonl"
+DISTRACTOR_BLOCK_BYTES = 32 * 2**20  # working memory per similarity tile (~32 MB)
+DISTRACTOR_BLOCK_ROWS = 256          # answer rows per tile; columns fill the rest of the budget
+
+
+def nearest_answer_indices(vectors, k, exclude, block_bytes=DISTRACTOR_BLOCK_BYTES,
+                           block_rows=DISTRACTOR_BLOCK_ROWS):
+    """
+    For every row of the (L2-normalized) vectors, return up to k indices of
+    the most similar other rows, skipping the indices in exclude[row].
+    Similarities are computed in row x column tiles of at most block_bytes,
+    keeping a running top-k per row, so memory stays flat as the bank grows.
+    """
+    n = vectors.shape[0]
+    result = []
+    probe = min(n, k + 8)  # a few spare candidates for excluded rows
+    rows = max(1, min(n, block_rows))
+    # Per tile: float32 similarities plus argpartition's int64 indices
+    cols = max(probe, min(n, block_bytes // (12 * rows)))
+
+    for start in range(0, n, rows):
+        block = vectors[start:start + rows]
+        best_sims = np.empty((len(block), 0), dtype=np.float32)
+        best_idx = np.empty((len(block), 0), dtype=np.int64)
+
+        for col in range(0, n, cols):
+            sims = block @ vectors[col:col + cols].T
+            if sims.shape[1] > probe:
+                top = np.argpartition(-sims, probe - 1, axis=1)[:, :probe]
+                sims = np.take_along_axis(sims, top, axis=1)
+            else:
+                top = np.broadcast_to(np.arange(sims.shape[1]), sims.shape)
+            best_sims = np.concatenate((best_sims, sims), axis=1)
+            best_idx = np.concatenate((best_idx, top + col), axis=1)
+            if best_sims.shape[1] > probe:
+                keep = np.argpartition(-best_sims, probe - 1, axis=1)[:, :probe]
+                best_sims = np.take_along_axis(best_sims, keep, axis=1)
+                best_idx = np.take_along_axis(best_idx, keep, axis=1)
+
+        for row, (row_sims, row_cands) in enumerate(zip(best_sims, best_idx)):
+            idx = start + row
+            ordered = row_cands[np.argsort(-row_sims)]
+            picked = [int(j) for j in ordered if j not in exclude[idx]][:k]
+            if len(picked) < k:
+                # More excluded neighbours than spare candidates: one full row (N floats)
+                picked = [int(j) for j in np.argsort(-(vectors @ vectors[idx])) if j not in exclude[idx]][:k]
+            result.append(picked)
+
+    return result
+
+
+def build_trivia_bank(output_path=TRIVIA_GENERATED_FILE, qa_dict=None):
+    """
+    Generate multiple-choice trivia from the knowledge base: the first answer
+    of each question is the correct option, and the distractors are the
+    nearest other answers in embedding space (one batched embedding pass).
+    Writes a JSONL trivia bank plus its offset index for --trivia-bank.
+    """
+    logger = logging.getLogger(__name__)
+    qa_dict = qa_dict if qa_dict is not None else known_questions()
+
+    questions = [q for q, answers in qa_dict.items() if answers]
+    correct = [qa_dict[q][0] for q in questions]
+    distractors_needed = len(OPTION_LETTERS) - 1
+
+    # Unique answer texts; each remembers which questions it answers
+    answer_ids = {}
+    owners = []
+    for q_idx, q in enumerate(questions):
+        for ans in qa_dict[q]:
+            if ans not in answer_ids:
+                answer_ids[ans] = len(owners)
+                owners.append(set())
+            owners[answer_ids[ans]].add(q_idx)
+
+    if len(answer_ids) <= distractors_needed:
+        print(f"{current_time()} ERROR: Need at least {distractors_needed + 1} different answers to build trivia.")
+        return None
+
+    start = time.perf_counter()
+    answers = list(answer_ids)
+    vectors = np.array(list(EMBED_MODEL.embed(answers)), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    # An answer can't be a distractor for a question it (or a synonym) answers
+    exclude = [
+        {answer_ids[a] for q_idx in owners[i] for a in qa_dict[questions[q_idx]]}
+        for i in range(len(answers))
+    ]
+    neighbours = nearest_answer_indices(vectors, distractors_needed, exclude)
+
+    tmp_path = f"{output_path}.tmp"
+    written = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for q, ans in zip(questions, correct):
+            wrong = [answers[j] for j in neighbours[answer_ids[ans]]]
+            if len(wrong) < distractors_needed:
+                continue
+            options = wrong[:distractors_needed]
+            slot = random.randrange(len(OPTION_LETTERS))
+            options.insert(slot, ans)
+            f.write(json.dumps({
+                "question": q[:1].upper() + q[1:],
+                "options": options,
+                "correct": OPTION_LETTERS[slot]
+            }, ensure_ascii=False) + "\n")
+            written += 1
+    os.replace(tmp_path, output_path)
+
+    with FileTriviaBank(output_path):  # build the offset index now, so game start is instant
+        pass
+    elapsed = time.perf_counter() - start
+    logger.info("Built %d trivia questions in %.2fs -> %s", written, elapsed, output_path)
+    print(f"{current_time()} Built {written} trivia questions in {elapsed:.2f}s: {output_path}")
+    return output_path
+
+
+def open_trivia_bank(path=None):
+    path = path if path is not None else TRIVIA_BANK_FILE
+    if path is None:
+        return ListTriviaBank(TRIVIA_QUESTIONS)
+    return FileTriviaBank(path)
+
+
+def trivia_game(bank=None):
     print(f"{current_time()} Trivia mode activated! Type 'trivia' again to exit the game early.\n")
 
+    owned = bank is None
+    try:
+        if owned:
+            bank = open_trivia_bank()
+        sampler = TriviaSampler(bank)
+    except (OSError, ValueError, csv.Error) as e:
+        print(f"{current_time()} ERROR: Could not open trivia bank: {e}")
+        if owned and bank is not None:
+            bank.close()
+        return
+
+    try:
+        _play_trivia(sampler)
+    finally:
+        if owned:
+            bank.close()
+
+
+def _play_trivia(sampler):
     score = 0
     asked = 0
     total_questions = 10
 
-    # Make a shuffled copy so we don't modify original
-    questions = random.sample(TRIVIA_QUESTIONS, len(TRIVIA_QUESTIONS))
+    if not len(sampler.bank):
+        print(f"{current_time()} No trivia available: the trivia bank is empty.")
+        return
 
     while asked < total_questions:
 
@@ -1068,7 +4256,11 @@ def trivia_game():
               f"Question {asked + 1} of {total_questions}; "
               f"Score {score}/{total_questions}")
 
-        q = questions[asked % len(questions)]
+        q = sampler.next()
+        sampler.save()
+        if q is None:
+            print(f"{current_time()} No trivia available: every question in the bank is malformed.")
+            return
         print(f"{current_time()} Q{asked+1}: {q['question']}")
         for opt in q["options"]:
             print(f"   {opt}")
@@ -1079,7 +4271,7 @@ def trivia_game():
         if user_answer.lower() == "trivia":
 
             show_score_on_led(f'{score}/{asked}')
-            show_symbol(GAME_EXIT_SYMBOL)   
+            show_symbol(FRAME_CACHE["game_exit"])   
             print(f"{current_time()} Exiting Trivia mode early.")
             print(f"{current_time()} Your score: {score}/{asked}\n")
             return
@@ -1104,15 +4296,145 @@ def trivia_game():
 
     print(f"{current_time()} Trivia complete! Your final score: {score}/{total_questions}\n")
 
-def setup_logging(enable_log: bool, log_level: str, log_file: str, enable_debug: bool):
+# ===============================
+# Startup Profiling
+# ===============================
+IMPORT_TREE_MIN_MS = 5.0   # hide imports cheaper than this (cumulative) in the tree
+
+
+def startup_report(marks=None):
+    """
+    Rows of (phase, wall ms, cpu ms, RSS delta MB, RSS MB, cumulative wall ms).
+    The first row is the interpreter itself: CPU and RSS used before the
+    first line of this file ran (its wall time is unknown).
+    """
+    marks = STARTUP_MARKS if marks is None else marks
+    if not marks:
+        return []
+    name, wall0, cpu0, rss0 = marks[0]
+    rows = [(name, None, cpu0 * 1000, rss0 / 2**20, rss0 / 2**20, 0.0)]
+    for (_, wall_a, cpu_a, rss_a), (name, wall_b, cpu_b, rss_b) in zip(marks, marks[1:]):
+        rows.append((name, (wall_b - wall_a) * 1000, (cpu_b - cpu_a) * 1000,
+                     (rss_b - rss_a) / 2**20, rss_b / 2**20, (wall_b - wall0) * 1000))
+    return rows
+
+
+def print_startup_profile():
+    print(f"{current_time()} Startup profile:")
+    print(f"  {'phase':<40}{'wall ms':>10}{'cpu ms':>10}{'+RSS MB':>10}{'RSS MB':>10}{'total ms':>10}")
+    for name, wall, cpu, rss_delta, rss, total in startup_report():
+        wall_text = f"{'-':>10}" if wall is None else f"{wall:>10.1f}"
+        print(f"  {name:<40}{wall_text}{cpu:>10.1f}{rss_delta:>10.1f}{rss:>10.1f}{total:>10.1f}")
+
+
+def parse_importtime(lines):
+    """
+    Turn `python -X importtime` output into a tree of
+    {"name", "self_ms", "cumulative_ms", "children"} (top-level imports).
+    """
+    pending = []  # (depth, node); importtime prints children before their parent
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        children = []
+        while pending and pending[-1][0] == depth + 1:
+            children.append(pending.pop()[1])
+        pending.append((depth, {
+            "name": name.strip(),
+            "self_ms": int(fields[0]) / 1000,
+            "cumulative_ms": int(fields[1]) / 1000,
+            "children": children[::-1],
+        }))
+    return [node for _, node in pending]
+
+
+def import_tree(module="TerminalTalk_v4"):
+    """Import module in a fresh interpreter with -X importtime and return the parsed tree."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+    )
+    return parse_importtime(result.stderr.splitlines())
+
+
+def print_import_tree(nodes, min_ms=IMPORT_TREE_MIN_MS, depth=0):
+    for node in sorted(nodes, key=lambda n: n["cumulative_ms"], reverse=True):
+        if node["cumulative_ms"] < min_ms:
+            continue
+        print(f"  {node['cumulative_ms']:>9.1f} ms {node['self_ms']:>9.1f} ms  {'  ' * depth}{node['name']}")
+        print_import_tree(node["children"], min_ms, depth + 1)
+
+
+LOG_MAX_BYTES = 5 * 1024 * 1024   # rotate the log file at this size
+LOG_BACKUPS = 3                   # rotated files kept (terminaltalk.log.1 ...)
+LOG_LISTENER = None
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, thread, message (+ exc)."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread when
+    that is safe: records whose arguments are all immutable scalars (str,
+    numbers, bytes, None) are enqueued untouched. Any other argument could
+    be mutated after the call, so those messages are formatted here.
+    """
+
+    FROZEN_TYPES = (str, bytes, numbers.Number, type(None))
+
+    def prepare(self, record):
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(a, self.FROZEN_TYPES) for a in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread (safe to call twice)."""
+    global LOG_LISTENER
+    if LOG_LISTENER is not None:
+        LOG_LISTENER.stop()
+        for handler in LOG_LISTENER.handlers:
+            handler.close()
+        LOG_LISTENER = None
+
+
+def setup_logging(enable_log: bool, log_level: str, log_file: str, enable_debug: bool,
+                  log_format: str = "text", max_bytes: int = LOG_MAX_BYTES, backups: int = LOG_BACKUPS):
     """
     Unified logging setup:
     - Console shows DEBUG if --debug is used, WARNING otherwise.
     - Log file stores only INFO and WARNING messages when --log is enabled.
+      It is written by a QueueListener thread (callers only enqueue), in
+      text or JSON lines format, and rotated at max_bytes.
     - Debug messages are NOT written to log file (not required by assignment).
+    - The root level is the lowest level any handler wants, so filtered
+      calls return before their arguments are formatted.
     """
+    global LOG_LISTENER
+    stop_logging()
+
     root = logging.getLogger()
-    root.setLevel(logging.DEBUG)  # Master level, handlers decide what to output
 
     # Remove old handlers to prevent duplicates
     if root.handlers:
@@ -1131,20 +4453,38 @@ def setup_logging(enable_log: bool, log_level: str, log_file: str, enable_debug:
         console_handler.setLevel(logging.WARNING) # Normal run → only warnings on console
 
     root.addHandler(console_handler)
+    levels = [console_handler.level]
 
     # ---------------------------
-    # File Handler (only if --log is set)
+    # File Handler (only if --log is set), fed through a queue
     # ---------------------------
     if enable_log:
-        file_handler = logging.FileHandler(log_file, mode="a", encoding="utf-8")
-        file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        file_handler = RotatingFileHandler(log_file, mode="a", maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        if log_format == "json":
+            file_handler.setFormatter(JsonLogFormatter())
+        else:
+            file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
         file_handler.setLevel(getattr(logging, log_level.upper()))  # INFO or WARNING
-        root.addHandler(file_handler)
+        levels.append(file_handler.level)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = DeferredQueueHandler(log_queue)
+        queue_handler.setLevel(file_handler.level)
+        root.addHandler(queue_handler)
+        LOG_LISTENER = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+        LOG_LISTENER.start()
 
+    root.setLevel(min(levels))
     return root
 
 
+atexit.register(stop_logging)
+
+
 def main():
+    global RAW_RETENTION_DAYS, SUMMARY_RETENTION_DAYS, TRIVIA_BANK_FILE, IMPORT_WORKERS, IMPORT_DEDUP_THRESHOLD
+    global LATENCY_ENABLED
+
     # parser = argparse.ArgumentParser(description="TerminalTalk - A Terminal Chatbot")
     parser = CustomArgumentParser(description="TerminalTalk - A Terminal Chatbot")
 
@@ -1156,20 +4496,93 @@ def main():
     parser.add_argument("--answer",action="append",help="Answer text for --add. Use multiple --answer options for multiple answers.",)
     
     parser.add_argument("--import",dest="import_mode",action="store_true",help="Import questions/answers from a file instead of using internal ones",)
-    parser.add_argument("--filetype",type=str,default="CSV",help="Type of import file (currently only CSV is supported)",)
+    parser.add_argument("--filetype",type=str,default="CSV",help="Type of import file (CSV or JSONL; detected from the .csv/.jsonl extension)",)
     parser.add_argument("--filepath",type=str,help="Path to the import file (e.g. ./qa.csv)",)
     
+    parser.add_argument("--import-workers",type=int,default=1,help="Processes used to parse and embed an imported CSV (0 = all cores)",)
+    parser.add_argument("--dedup",nargs="?",type=float,const=DEDUP_THRESHOLD,metavar="THRESHOLD",help=f"With --import: merge near-duplicate questions (cosine >= THRESHOLD, default {DEDUP_THRESHOLD})",)
+    parser.add_argument("--watch",action="store_true",help="With --import: reload the CSV when it changes, re-embedding only new questions",)
     parser.add_argument("--list-questions",action="store_true",help="List all known questions and exit",)
     
+    parser.add_argument("--batch",action="store_true",help="Read questions from stdin (one per line) and print JSON answers, one per line",)
+    parser.add_argument("--serve",action="store_true",help="Answer questions over HTTP (GET /ask?q=..., GET /metrics) instead of chatting",)
+    parser.add_argument("--host",default=SERVER_HOST,help=f"Address for --serve (default {SERVER_HOST})",)
+    parser.add_argument("--port",type=int,default=SERVER_PORT,help=f"Port for --serve (default {SERVER_PORT})",)
+    parser.add_argument("--metrics-textfile",metavar="PATH",help="Rewrite Prometheus metrics to PATH periodically (node_exporter textfile collector)",)
+    parser.add_argument("--metrics-interval",type=float,default=METRICS_TEXTFILE_INTERVAL_SECONDS,help="Seconds between --metrics-textfile rewrites",)
+    parser.add_argument("--latency-stats",action="store_true",help="Time each answer stage; view with 'stats' in chat, printed on exit",)
+    parser.add_argument("--profile-startup",nargs="?",const="table",choices=["table", "tree"],help="Print wall/CPU/RSS per startup phase, then exit; 'tree' adds an importtime-style import tree",)
     parser.add_argument("--log", action="store_true", help="Enable logging")
     parser.add_argument("--log-level", default="WARNING", choices=["INFO", "WARNING"], help="Logging level")
     parser.add_argument("--log-file", default="terminaltalk.log", help="Log file path")
+    parser.add_argument("--log-format", default="text", choices=["text", "json"], help="Log file format (json = one object per line)")
+    parser.add_argument("--log-max-bytes", type=int, default=LOG_MAX_BYTES, help="Rotate the log file at this size")
+    parser.add_argument("--log-backups", type=int, default=LOG_BACKUPS, help="Rotated log files to keep")
 
     parser.add_argument(
         "--debug",
         action="store_true",
         help="Enable debug mode for developers (prints internal diagnostic information)"
     )
+    parser.add_argument(
+        "--sample-interval",
+        type=float,
+        default=SAMPLER_INTERVAL_SECONDS,
+        help="Seconds between background temperature samples in chat mode"
+    )
+    parser.add_argument(
+        "--build-trivia",
+        action="store_true",
+        help="Generate multiple-choice trivia from the knowledge base (use -o for the output file)"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        type=str,
+        help="Output file for --build-trivia / --compile"
+    )
+    parser.add_argument(
+        "--compile",
+        metavar="KB_CSV",
+        help="Compile a Q&A CSV into a single-file knowledge-base bundle (use -o for the output file)"
+    )
+    parser.add_argument(
+        "--bundle",
+        metavar="BUNDLE",
+        help="Answer from a compiled knowledge-base bundle (memory-mapped)"
+    )
+    parser.add_argument(
+        "--verify-bundle",
+        action="store_true",
+        help="Check the bundle's SHA-256 checksum when loading it"
+    )
+    parser.add_argument(
+        "--trivia-bank",
+        type=str,
+        help="CSV or JSONL file with trivia questions (default: built-in questions)"
+    )
+    parser.add_argument(
+        "--idle-delay",
+        type=float,
+        default=IDLE_DISPLAY_DELAY_SECONDS,
+        help="Seconds without input before the LED matrix shows the temperature (negative disables)"
+    )
+    parser.add_argument(
+        "--raw-retention-days",
+        type=int,
+        default=RAW_RETENTION_DAYS,
+        help="Days of raw temperature samples to keep before compacting them into daily summaries"
+    )
+    parser.add_argument(
+        "--summary-retention-days",
+        type=int,
+        default=SUMMARY_RETENTION_DAYS,
+        help="Days of daily temperature summaries to keep"
+    )
+    parser.add_argument(
+        "--compact-temperature-logs",
+        action="store_true",
+        help="Apply temperature log retention/compaction once and exit"
+    )
     parser.add_argument(
         "--temp-diff",
         action="store_true",
@@ -1177,8 +4590,25 @@ def main():
     )
 
     args = parser.parse_args()
+    mark_startup("argument parsing")
+
+    RAW_RETENTION_DAYS = args.raw_retention_days
+    SUMMARY_RETENTION_DAYS = args.summary_retention_days
+    TRIVIA_BANK_FILE = args.trivia_bank
+    IMPORT_WORKERS = args.import_workers
+    IMPORT_DEDUP_THRESHOLD = args.dedup
+    LATENCY_ENABLED = args.latency_stats
+
+    if args.compact_temperature_logs:
+        compact_temperature_logs()
+        print(f"{current_time()} Temperature logs compacted.")
+        return
+
     if args.temp_diff:
-        log_local_temperature()
+        if SENSE_AVAILABLE:
+            sample = (datetime.now().timestamp(), read_temperature())
+            TEMPERATURE_STORE.add(*sample)
+            log_local_temperature([sample])
         result = get_last_3_days_temperature_change()
         print(f"{current_time()}  {result}")
         return
@@ -1189,7 +4619,10 @@ def main():
         enable_log=args.log,
         log_level=args.log_level,
         log_file=args.log_file,
-        enable_debug=args.debug
+        enable_debug=args.debug,
+        log_format=args.log_format,
+        max_bytes=args.log_max_bytes,
+        backups=args.log_backups,
     )
 
     if args.debug:
@@ -1199,12 +4632,26 @@ def main():
     if args.log:
         logger.info("Logging enabled at level %s (file: %s)", args.log_level, args.log_file)
 
+    if args.compile:
+        compile_kb_cli(args.compile, args.output or "kb.ttbundle")
+        return
+
+    if args.bundle:
+        try:
+            load_bundle(args.bundle, verify=args.verify_bundle)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"{current_time()} ERROR: Could not load bundle: {e}")
+            print(f"{current_time()} Using internal questions instead.")
+
     if args.import_mode:
         if not args.filepath:
             print(f"{current_time()} ERROR: --import was used but no --filepath was provided.")
             print(f"{current_time()} Using internal questions instead.")
         else:
             safe_import_csv(args.filepath)
+            if args.watch and not args.question and isinstance(IMPORTED_QA, IndexedQA):
+                start_kb_watcher(args.filepath)
+    mark_startup("knowledge-base load (--bundle/--import)")
     
     if args.add:
         if not args.question:
@@ -1227,14 +4674,53 @@ def main():
 
     if args.list_questions:
         return list_questions()
+
+    if args.build_trivia:
+        build_trivia_bank(args.output or TRIVIA_GENERATED_FILE)
+        return
     
     # Build embeddings before answering
     rebuild_embeddings()
-    if args.question:
-        direct_mode(args.question)
-    else:
-        chat_mode()
+    mark_startup("rebuild_embeddings()")
+
+    if args.profile_startup:
+        get_location_intent_embeddings()
+        mark_startup("location intent embeddings")
+        print_startup_profile()
+        if args.profile_startup == "tree":
+            print(f"{current_time()} Import tree (cumulative, self; fresh interpreter, >= {IMPORT_TREE_MIN_MS:g} ms):")
+            print_import_tree(import_tree())
+        if KB_WATCHER is not None:
+            KB_WATCHER.stop()
+        return
 
+    metrics_writer = None
+    if args.metrics_textfile:
+        metrics_writer = MetricsTextfileWriter(args.metrics_textfile, args.metrics_interval)
+        metrics_writer.start()
+
+    try:
+        if args.serve:
+            serve_mode(args.host, args.port)
+        elif args.batch:
+            batch_mode()
+        elif args.question:
+            direct_mode(args.question)
+        else:
+            chat_mode(args.sample_interval, args.idle_delay)
+    finally:
+        if KB_WATCHER is not None:
+            KB_WATCHER.stop()
+        if metrics_writer is not None:
+            metrics_writer.stop()
+        shutdown_led_worker()
+        if LATENCY_ENABLED and LATENCY_STATS:
+            report = format_latency_stats()
+            print(f"{current_time()} {report}")
+            logging.getLogger(__name__).info("%s", report)
+
+
+mark_startup("rest of module")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,332 @@
+"""
+Benchmark suite for TerminalTalk_v4 question answering.
+
+Builds synthetic knowledge bases of increasing size and measures each stage
+of answer_question() (substring match, query embedding, similarity,
+location-intent check, enrichment, total), plus interpreter startup and
+rebuild_embeddings() throughput. Results are written as JSON so runs can be
+compared over time:
+
+    python benchmark_terminaltalk.py --sizes 1000,10000 -o before.json
+    python benchmark_terminaltalk.py --sizes 1000,10000 -o after.json --compare before.json
+
+Stage times come from the real answer path: answer_question() runs for every
+query while its latency spans are recorded, so a stage only has samples for
+the queries that reach it (enrichment only runs for location questions).
+Query-time stages run against random unit vectors (the cost of a similarity
+scan does not depend on the values), so 1M-question KBs can be measured
+without embedding a million questions; rebuild_embeddings() throughput uses
+the real model on up to --embed-sample questions.
+
+The temperature history used by enrichment is a synthetic one in a temporary
+directory, never the store in the working directory. Without --with-weather
+fetch_weather() returns a fixed string instead of calling the weather API.
+"""
+import argparse
+import collections
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+import TerminalTalk_v4 as tt
+
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+STAGES = ["substring", "embed_query", "similarity", "location_intent", "enrichment", "total"]
+SPAN_STAGES = {
+    "answer.substring": "substring",
+    "answer.embed_query": "embed_query",
+    "answer.similarity": "similarity",
+    "answer.location_intent": "location_intent",
+    "answer.total": "total",
+}
+ENRICHMENT_SPANS = ("answer.weather", "answer.temperature_log")
+
+TOPICS = [
+    "git", "pip", "python", "the library", "lecture hall", "the cafeteria", "wifi",
+    "the exam office", "moodle", "the campus map", "student id", "printing",
+]
+TEMPLATES = [
+    "what is {topic} number {i}?",
+    "how do i use {topic} {i}?",
+    "where can i find {topic} {i}?",
+    "who is responsible for {topic} {i}?",
+]
+PARAPHRASES = [
+    "could you explain {topic} to me",
+    "i need some help with {topic}",
+    "tell me more about {topic} please",
+]
+LOCATION_QUERIES = [
+    "where is {topic} located",
+    "how do i get to {topic}",
+]
+
+
+class SyntheticQA(tt.CompactQA):
+    """CompactQA carrying a precomputed embedding matrix, like an imported index."""
+
+
+def synthetic_items(size, answer_pool=1000, seed=0):
+    rng = random.Random(seed)
+    answers = [f"Synthetic answer {i} with a sentence or two of typical text." for i in range(answer_pool)]
+    for i in range(size):
+        question = TEMPLATES[i % len(TEMPLATES)].format(topic=TOPICS[i % len(TOPICS)], i=i)
+        yield question, rng.sample(answers, rng.randint(1, 4))
+
+
+def random_unit_vectors(n, dim, seed=0, chunk=65536):
+    rng = np.random.default_rng(seed)
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, chunk):
+        block = rng.standard_normal((min(chunk, n - start), dim), dtype=np.float32)
+        out[start:start + len(block)] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return out
+
+
+def build_queries(qa, count, seed=0):
+    """A mix of substring hits, semantic-only paraphrases and location questions."""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        kind = i % 3
+        topic = rng.choice(TOPICS)
+        if kind == 0:
+            queries.append(qa.questions[rng.randrange(len(qa))])
+        elif kind == 1:
+            queries.append(rng.choice(PARAPHRASES).format(topic=topic))
+        else:
+            queries.append(rng.choice(LOCATION_QUERIES).format(topic=topic))
+    return queries
+
+
+def percentiles(samples_ms):
+    values = np.asarray(samples_ms, dtype=np.float64)
+    if not len(values):
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "n": int(len(values)),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(values.max()),
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+class SpanRecorder:
+    """Stands in for TerminalTalk_v4.span(), keeping every duration instead of histogram buckets."""
+
+    def __init__(self):
+        self.samples = collections.defaultdict(list)
+
+    @contextlib.contextmanager
+    def __call__(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[name].append((time.perf_counter() - start) * 1000)
+
+
+def synthetic_temperatures(days=3, per_hour=60, seed=0):
+    """(timestamp, temp) samples, one per minute by default, ending now."""
+    rng = random.Random(seed)
+    now = time.time()
+    count = days * 24 * per_hour
+    return [(now - (count - i) * 3600 / per_hour, round(rng.uniform(18.0, 26.0), 2)) for i in range(count)]
+
+
+@contextlib.contextmanager
+def isolated_answer_path(recorder, with_weather=False):
+    """Point TerminalTalk_v4 at a temporary temperature store and record its spans."""
+    saved = {name: getattr(tt, name) for name in ("span", "fetch_weather", "TEMPERATURE_STORE", "TEMP_LOG_FILE")}
+    logger = logging.getLogger(tt.__name__)
+    level = logger.level
+    logger.setLevel(logging.ERROR)  # every synthetic miss would log a warning
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        store = tt.TemperatureStore(ring_path=os.path.join(tmp, "temperature_raw.ring"), legacy_raw_path=None)
+        store.add_many(synthetic_temperatures())
+        tt.TEMPERATURE_STORE = store
+        tt.TEMP_LOG_FILE = os.path.join(tmp, "temperature_log.json")
+        tt.span = recorder
+        if not with_weather:
+            tt.fetch_weather = lambda city: f"Weather in {city}: benchmark placeholder"
+        try:
+            yield
+        finally:
+            for name, value in saved.items():
+                setattr(tt, name, value)
+            logger.setLevel(level)
+
+
+def measure_stages(queries, with_weather=False):
+    """Run answer_question() on each query and collect the duration of every stage it went through."""
+    timings = {stage: [] for stage in STAGES}
+    recorder = SpanRecorder()
+
+    with isolated_answer_path(recorder, with_weather):
+        for query in queries:
+            recorder.samples.clear()
+            tt.answer_question(query)
+            for name, stage in SPAN_STAGES.items():
+                timings[stage].extend(recorder.samples.get(name, []))
+            if recorder.samples.get("answer.temperature_log"):
+                timings["enrichment"].append(sum(sum(recorder.samples[n]) for n in ENRICHMENT_SPANS))
+
+    return {stage: percentiles(values) for stage, values in timings.items()}
+
+
+def measure_rebuild(qa, sample):
+    """rebuild_embeddings() throughput with the real model on the first `sample` questions."""
+    items = ((q, qa[q]) for q, _ in zip(qa.questions, range(sample)))
+    subset = tt.CompactQA.from_items(items)  # no .embeddings: forces embedding
+    tt.IMPORTED_QA = subset
+    tt.invalidate_embeddings()
+    _, ms = timed(tt.rebuild_embeddings)
+    return {
+        "questions": len(subset),
+        "seconds": ms / 1000,
+        "questions_per_s": len(subset) / max(ms / 1000, 1e-9),
+    }
+
+
+def benchmark_size(size, queries=200, embed_sample=2000, with_weather=False, seed=0):
+    result = {"questions": size}
+
+    start = time.perf_counter()
+    qa = SyntheticQA.from_items(synthetic_items(size, seed=seed))
+    result["build_kb_s"] = time.perf_counter() - start
+
+    dim = tt.get_location_intent_embeddings().shape[1]
+    qa.embeddings = random_unit_vectors(size, dim, seed=seed)
+    tt.IMPORTED_QA = qa
+    tt.invalidate_embeddings()
+    _, result["rebuild_precomputed_ms"] = timed(tt.rebuild_embeddings)
+
+    query_list = build_queries(qa, queries, seed=seed)
+    measure_stages(query_list[:3], with_weather)  # warm-up: hash index, ONNX session, caches
+    result["stages"] = measure_stages(query_list, with_weather)
+    result["rebuild_embeddings"] = measure_rebuild(qa, min(size, embed_sample))
+
+    tt.IMPORTED_QA = None
+    tt.invalidate_embeddings()
+    return result
+
+
+def measure_startup(runs=3):
+    """Wall time of a fresh interpreter importing TerminalTalk_v4 (model load included)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import TerminalTalk_v4"], cwd=here, check=True,
+                       stdout=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "model": tt.EMBED_MODEL_NAME,
+    }
+
+
+def print_report(results):
+    startup = results["startup"]
+    print(f"startup: p50 {startup['p50_ms']:.0f} ms" if startup.get("n") else "startup: skipped")
+    for size, entry in results["sizes"].items():
+        rebuild = entry["rebuild_embeddings"]
+        print(f"\n{int(size):,} questions (KB built in {entry['build_kb_s']:.2f}s, "
+              f"rebuild_embeddings {rebuild['questions_per_s']:.0f} q/s)")
+        print(f"  {'stage':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage in STAGES:
+            s = entry["stages"].get(stage, {})
+            if not s.get("n"):
+                print(f"  {stage:<16}{'-':>10}{'-':>10}{'-':>10}  (not reached)")
+                continue
+            print(f"  {stage:<16}{s['p50_ms']:>10.3f}{s['p95_ms']:>10.3f}{s['p99_ms']:>10.3f}")
+
+
+def print_comparison(results, baseline):
+    print(f"\nchange vs {baseline['environment'].get('git_commit') or 'baseline'} (p50 / p95):")
+    for size, entry in results["sizes"].items():
+        old = baseline.get("sizes", {}).get(size)
+        if not old:
+            continue
+        print(f"  {int(size):,} questions")
+        for stage in STAGES:
+            new_s, old_s = entry["stages"].get(stage), old["stages"].get(stage)
+            if not new_s or not new_s.get("n") or not old_s or not old_s.get("n"):
+                continue
+            ratios = [new_s[k] / old_s[k] if old_s[k] else float("nan") for k in ("p50_ms", "p95_ms")]
+            print(f"    {stage:<16}x{ratios[0]:.2f} / x{ratios[1]:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TerminalTalk_v4 answer latency per stage")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated KB sizes (default: 1000,10000,100000,1000000)")
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries per KB size")
+    parser.add_argument("--embed-sample", type=int, default=2000,
+                        help="Questions embedded to measure rebuild_embeddings() throughput")
+    parser.add_argument("--startup-runs", type=int, default=3, help="Fresh-interpreter imports to time (0 = skip)")
+    parser.add_argument("--with-weather", action="store_true",
+                        help="Make the real weather HTTP call in enrichment (default: a fixed string)")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="Print ratios against an earlier results file")
+    args = parser.parse_args()
+
+    results = {
+        "environment": environment(),
+        "startup": measure_startup(args.startup_runs) if args.startup_runs > 0 else {"n": 0},
+        "sizes": {},
+    }
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        print(f"Benchmarking {size:,} questions...", flush=True)
+        results["sizes"][str(size)] = benchmark_size(
+            size, queries=args.queries, embed_sample=args.embed_sample, with_weather=args.with_weather
+        )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print_report(results)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(results, json.load(f))
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Log-replay load generator for TerminalTalk_v4.
+
+Streams one or more terminaltalk.log files (text or --log-format json),
+extracts the "Received question:" traffic with its original inter-arrival
+times, and replays it against one of TerminalTalk's modes:
+
+    direct   one `TerminalTalk_v4.py --question ...` process per question
+    batch    long-lived `TerminalTalk_v4.py --batch` processes, one per worker
+    server   HTTP POST /ask against a running `TerminalTalk_v4.py --serve`
+
+    python replay_terminaltalk_log.py terminaltalk.log --mode server --speed 20 --concurrency 4
+
+It reports throughput, latency percentiles, send lag (how far behind the
+schedule requests went out) and how the match mix (substring / semantic /
+none) drifted from what the log recorded.
+"""
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "TerminalTalk_v4.py")
+TEXT_TS_FORMAT = "%Y-%m-%d %H:%M:%S,%f"
+CLASSIFY_WINDOW = 16      # questions kept open waiting for their match line
+NO_MATCH_TEXT = "don't recognize"
+
+LogQuestion = collections.namedtuple("LogQuestion", "ts question match")
+
+
+# ===============================
+# Log parsing
+# ===============================
+def parse_log_line(line):
+    """(timestamp, level, message) from a text or JSON log line, or None."""
+    line = line.rstrip("\n")
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+            return datetime.fromisoformat(entry["ts"]).timestamp(), entry.get("level"), entry["message"]
+        except (ValueError, KeyError, TypeError):
+            return None
+    try:
+        ts = datetime.strptime(line[:23], TEXT_TS_FORMAT).timestamp()
+    except ValueError:
+        return None
+    level, _, message = line[24:].partition(" ")
+    return ts, level, message
+
+
+def iter_log_questions(paths):
+    """
+    Yield LogQuestion(ts, question, match) in log order. The baseline match
+    comes from the lines get_answer() logs after "Received question:":
+    "Semantic match: ..." -> semantic, "No match found ..." -> none, neither
+    -> substring (those are only logged at DEBUG). A semantic hit that is
+    not a location question logs both lines and gets the "Sorry" answer,
+    so a later "No match found" overrides "semantic".
+    """
+    open_questions = collections.deque()  # [ts, question, match] awaiting classification
+
+    def settle(keep):
+        while len(open_questions) > keep:
+            ts, question, match = open_questions.popleft()
+            yield LogQuestion(ts, question, match or "substring")
+
+    def classify(question, match, overrides=(None,)):
+        for record in reversed(open_questions):
+            if record[1] == question and record[2] in overrides:
+                record[2] = match
+                return
+
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                parsed = parse_log_line(line)
+                if parsed is None:
+                    continue
+                ts, _, message = parsed
+                if message.startswith("Received question: "):
+                    open_questions.append([ts, message[len("Received question: "):], None])
+                    yield from settle(CLASSIFY_WINDOW)
+                elif message.startswith("Semantic match: '") and "' -> '" in message:
+                    classify(message[len("Semantic match: '"):].rsplit("' -> '", 1)[0], "semantic")
+                elif message.startswith("No match found for question: "):
+                    classify(message[len("No match found for question: "):], "none", (None, "semantic"))
+    yield from settle(0)
+
+
+def schedule(questions, speed=1.0, max_gap=60.0, limit=None):
+    """
+    Yield (offset seconds from replay start, LogQuestion). Gaps longer than
+    max_gap (original time) are shortened to max_gap before the speed-up,
+    so idle nights do not stall a replay.
+    """
+    offset = 0.0
+    previous = None
+    for n, item in enumerate(questions):
+        if limit is not None and n >= limit:
+            return
+        if previous is not None:
+            gap = max(0.0, item.ts - previous)
+            offset += min(gap, max_gap) / speed
+        previous = item.ts
+        yield offset, item
+
+
+# ===============================
+# Targets
+# ===============================
+def classify_answer(answer):
+    return "none" if NO_MATCH_TEXT in answer else "answered"
+
+
+class DirectTarget:
+    """One CLI process per question, as a cron job or shell user would run it."""
+
+    reports_match = False
+
+    def __init__(self, concurrency, extra_args=()):
+        self.extra_args = list(extra_args)
+
+    def ask(self, question):
+        result = subprocess.run(
+            [sys.executable, SCRIPT, *self.extra_args, "--question", question],
+            capture_output=True, text=True, check=True,
+        )
+        answer = result.stdout.strip()[len("HH:MM:SS "):]
+        return answer, classify_answer(answer)
+
+    def close(self):
+        pass
+
+
+class BatchTarget:
+    """`--batch` processes used as request/response pipes, one per worker."""
+
+    reports_match = True
+
+    def __init__(self, concurrency, extra_args=()):
+        self.pool = queue.Queue()
+        self.procs = []
+        for _ in range(concurrency):
+            proc = subprocess.Popen(
+                [sys.executable, SCRIPT, *extra_args, "--batch"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1,
+            )
+            self.procs.append(proc)
+            self._roundtrip(proc, "warm up")  # model load happens before the clock starts
+            self.pool.put(proc)
+
+    @staticmethod
+    def _roundtrip(proc, question):
+        proc.stdin.write(question.replace("\n", " ") + "\n")
+        proc.stdin.flush()
+        for line in proc.stdout:
+            if line.startswith("{"):  # skip any startup output
+                reply = json.loads(line)
+                return reply["answer"], reply["match"]
+        raise RuntimeError(f"batch process exited with code {proc.wait()}")
+
+    def ask(self, question):
+        proc = self.pool.get()
+        try:
+            return self._roundtrip(proc, question)
+        finally:
+            self.pool.put(proc)
+
+    def close(self):
+        for proc in self.procs:
+            proc.stdin.close()
+        for proc in self.procs:
+            proc.wait(timeout=30)
+
+
+class ServerTarget:
+    """HTTP POST /ask against a running --serve instance."""
+
+    reports_match = True
+
+    def __init__(self, concurrency, url="http://127.0.0.1:8765", timeout=30):
+        self.url = url.rstrip("/") + "/ask"
+        self.timeout = timeout
+
+    def ask(self, question):
+        request = urllib.request.Request(
+            self.url, data=json.dumps({"question": question}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            reply = json.loads(response.read())
+        return reply["answer"], reply["match"]
+
+    def close(self):
+        pass
+
+
+# ===============================
+# Replay
+# ===============================
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def replay(target, timeline, concurrency=1):
+    """
+    Send each question at its scheduled offset (a worker pool of size
+    concurrency) and collect per-request results.
+    """
+    results = []
+    lock = threading.Lock()
+
+    def run(item, scheduled, sent):
+        start = time.perf_counter()
+        try:
+            answer, match = target.ask(item.question)
+            error = None
+        except Exception as e:  # report, keep replaying
+            answer, match, error = None, None, f"{type(e).__name__}: {e}"
+        done = time.perf_counter()
+        with lock:
+            results.append({
+                "question": item.question,
+                "baseline": item.match,
+                "match": match,
+                "error": error,
+                "latency_ms": (done - start) * 1000,
+                "lag_ms": (sent - scheduled) * 1000,
+                "done": done,
+            })
+
+    replay_start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        slots = threading.Semaphore(concurrency)
+        for offset, item in timeline:
+            scheduled = replay_start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            slots.acquire()  # saturated workers show up as send lag, not an unbounded backlog
+            sent = time.perf_counter()
+
+            def task(item=item, scheduled=scheduled, sent=sent):
+                try:
+                    run(item, scheduled, sent)
+                finally:
+                    slots.release()
+            pool.submit(task)
+    return results, replay_start
+
+
+def summarize(results, replay_start, reports_match=True):
+    ok = [r for r in results if r["error"] is None]
+    latencies = sorted(r["latency_ms"] for r in ok)
+    lags = sorted(r["lag_ms"] for r in results)
+    elapsed = (max(r["done"] for r in results) - replay_start) if results else 0.0
+
+    def kind(match):
+        # Direct mode only sees the printed answer, so compare answered vs none there
+        if reports_match or match == "none":
+            return match
+        return "answered"
+
+    def mix(key):
+        counts = collections.Counter(kind(r[key]) for r in ok)
+        total = sum(counts.values()) or 1
+        return {k: v / total for k, v in sorted(counts.items())}
+
+    baseline, replayed = mix("baseline"), mix("match")
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+        "send_lag_ms": {"p50": percentile(lags, 50), "p95": percentile(lags, 95)},
+        "match_mix": {"baseline": baseline, "replay": replayed},
+        "match_drift_pp": {
+            k: 100 * (replayed.get(k, 0.0) - baseline.get(k, 0.0)) for k in sorted(set(baseline) | set(replayed))
+        },
+        "changed_matches": sum(1 for r in ok if kind(r["match"]) != kind(r["baseline"])),
+    }
+
+
+def print_summary(summary, mode, speed, concurrency):
+    print(f"Replayed {summary['requests']} questions against {mode} mode "
+          f"at {speed:g}x with concurrency {concurrency} in {summary['elapsed_s']:.1f}s")
+    print(f"  throughput   {summary['throughput_rps']:.2f} req/s ({summary['errors']} errors)")
+    lat = summary["latency_ms"]
+    print(f"  latency ms   p50 {lat['p50']:.1f}  p95 {lat['p95']:.1f}  p99 {lat['p99']:.1f}  max {lat['max']:.1f}")
+    lag = summary["send_lag_ms"]
+    print(f"  send lag ms  p50 {lag['p50']:.1f}  p95 {lag['p95']:.1f}")
+    print(f"  match mix    {'type':<10}{'log':>8}{'replay':>8}{'drift':>9}")
+    for kind, drift in summary["match_drift_pp"].items():
+        base = summary["match_mix"]["baseline"].get(kind, 0.0) * 100
+        now = summary["match_mix"]["replay"].get(kind, 0.0) * 100
+        print(f"               {kind:<10}{base:>7.1f}%{now:>7.1f}%{drift:>+8.1f}pp")
+    print(f"  {summary['changed_matches']} questions matched differently than in the log")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay terminaltalk.log question traffic as a load test")
+    parser.add_argument("logs", nargs="+", help="Log files in chronological order (e.g. terminaltalk.log.1 terminaltalk.log)")
+    parser.add_argument("--mode", choices=["direct", "batch", "server"], default="batch")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up, 1-100 (default 1)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight at once")
+    parser.add_argument("--max-gap", type=float, default=60.0,
+                        help="Cap on original inter-arrival gaps in seconds, applied before --speed")
+    parser.add_argument("--limit", type=int, help="Replay at most this many questions")
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="Server base URL for --mode server")
+    parser.add_argument("--target-args", default="",
+                        help="Extra TerminalTalk_v4.py arguments for direct/batch, e.g. \"--import --filepath qa.csv\"")
+    parser.add_argument("--json-out", help="Also write the summary as JSON")
+    args = parser.parse_args()
+
+    if not 1 <= args.speed <= 100:
+        parser.error("--speed must be between 1 and 100")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    extra = args.target_args.split()
+    if args.mode == "server":
+        target = ServerTarget(args.concurrency, args.url)
+    elif args.mode == "batch":
+        target = BatchTarget(args.concurrency, extra)
+    else:
+        target = DirectTarget(args.concurrency, extra)
+
+    try:
+        timeline = schedule(iter_log_questions(args.logs), args.speed, args.max_gap, args.limit)
+        results, replay_start = replay(target, timeline, args.concurrency)
+    finally:
+        target.close()
+
+    if not results:
+        print("No 'Received question:' lines found (was the log written with --log --log-level INFO?)")
+        return
+
+    summary = summarize(results, replay_start, target.reports_match)
+    print_summary(summary, args.mode, args.speed, args.concurrency)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(dict(summary, mode=args.mode, speed=args.speed, concurrency=args.concurrency), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
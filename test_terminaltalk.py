@@ -1,6 +1,17 @@
 import pytest
 from TerminalTalk_v3 import get_answer, QA_DATA
 
+
+@pytest.fixture(autouse=True)
+def isolated_kb(tmp_path, monkeypatch):
+    """Point TerminalTalk_v4's knowledge base at tmp_path instead of the repo directory."""
+    import TerminalTalk_v4 as tt
+    monkeypatch.setattr(tt, "QA_DATA", tt.SqliteQA(str(tmp_path / "qa_data.sqlite3"), seed=tt.SEED_QA_DATA))
+    tt.invalidate_embeddings()
+    yield
+    tt.invalidate_embeddings()
+
+
 def test_exact_match():
     q = "what is your name?"
     ans = get_answer(q)
@@ -15,3 +26,701 @@ def test_unknown_question():
     q = "why do aliens love pizza?"
     ans = get_answer(q)
     assert "don't recognize" in ans.lower()
+
+def test_temperature_store_hour_window_matches_raw_scan(tmp_path):
+    from datetime import datetime, timedelta
+    from TerminalTalk_v4 import TemperatureStore
+
+    store = TemperatureStore(str(tmp_path / "raw.ring"), legacy_raw_path=None)
+    now = datetime(2025, 5, 10, 12, 30)
+    samples = []
+    for i in reversed(range(5 * 24 * 2)):
+        ts = (now - timedelta(minutes=30 * i)).timestamp()
+        temp = 15 + (i % 17) * 0.5
+        samples.append((ts, temp))
+        store.add(ts, temp)
+
+    cutoff = (now - timedelta(days=3)).timestamp()
+    stats = store.hour_window_stats(cutoff, 9, 17, now=now)
+
+    expected = [t for ts, t in samples
+                if ts >= cutoff and 9 <= datetime.fromtimestamp(ts).hour < 17]
+    assert stats["count"] == len(expected)
+    assert abs(stats["sum"] - sum(expected)) < 1e-9
+    assert stats["min"] == min(expected) and stats["max"] == max(expected)
+
+def test_sampler_batches_fake_sensor_readings(tmp_path, monkeypatch):
+    import time
+    import TerminalTalk_v4 as tt
+    from TerminalTalk_v4 import FakeSensor, TemperatureSampler, TemperatureStore
+
+    # The sampler's periodic compaction writes the daily summary file
+    monkeypatch.setattr(tt, "TEMP_LOG_FILE", str(tmp_path / "summary.json"))
+    store = TemperatureStore(str(tmp_path / "raw.ring"), legacy_raw_path=None)
+    flushed = []
+    sampler = TemperatureSampler(FakeSensor([20.0, 21.0, 22.0]), store=store,
+                                 interval=0.01, batch_size=4, on_flush=flushed.append)
+    sampler.start()
+    time.sleep(0.2)
+    sampler.stop()
+
+    assert not sampler.is_alive()
+    assert all(len(batch) <= 4 for batch in flushed)
+    temps = store.ring.ordered()[1]
+    assert sum(len(batch) for batch in flushed) == len(temps) > 4
+    assert temps.tolist() == [[20.0, 21.0, 22.0][i % 3] for i in range(len(temps))]  # raw, not smoothed
+
+def test_temperature_ring_buffer_wraps_and_stays_ordered(tmp_path):
+    from TerminalTalk_v4 import TemperatureRingBuffer
+
+    ring = TemperatureRingBuffer(str(tmp_path / "raw.ring"), capacity=8)
+    ring.append_many(range(5), [float(i) for i in range(5)])
+    ring.append_many(range(5, 13), [float(i) for i in range(5, 13)])
+
+    reopened = TemperatureRingBuffer(str(tmp_path / "raw.ring"))
+    ts, temps = reopened.ordered()
+    assert reopened.count == 8 and reopened.written == 13
+    assert ts.tolist() == list(range(5, 13))
+    assert reopened.window(7, 10)[1].tolist() == [7.0, 8.0, 9.0]
+
+def test_out_of_order_batches_are_merged_into_the_ring(tmp_path):
+    from TerminalTalk_v4 import TemperatureRingBuffer, TemperatureStore
+
+    path = str(tmp_path / "raw.ring")
+    first, second = TemperatureStore(path, legacy_raw_path=None), TemperatureStore(path, legacy_raw_path=None)
+    first.add_many([(10.0, 1.0), (30.0, 3.0)])
+    second.add_many([(20.0, 2.0), (25.0, 2.5)])  # flushed late by another process
+    first.add_many([(5.0, 0.5)])                 # wall clock stepped back
+
+    assert first.ring.ordered()[0].tolist() == [5.0, 10.0, 20.0, 25.0, 30.0]
+    assert first.range_samples(10.0, 26.0)[1].tolist() == [1.0, 2.0, 2.5]
+    assert first.ring.written == 5
+
+    ring = TemperatureRingBuffer(str(tmp_path / "small.ring"), capacity=4)
+    ring.insert_many([1, 2, 6, 7], [1.0, 2.0, 6.0, 7.0])
+    ring.insert_many([5, 3], [5.0, 3.0])
+    assert ring.ordered()[0].tolist() == [3.0, 5.0, 6.0, 7.0]
+    assert ring.window(3, 6)[1].tolist() == [3.0, 5.0]
+
+def test_compaction_moves_old_raw_samples_into_summaries(tmp_path, monkeypatch):
+    import json
+    from datetime import datetime, timedelta
+    import TerminalTalk_v4 as tt
+
+    summary_path = tmp_path / "summary.json"
+    summary_path.write_text(json.dumps({"2000-01-01": {"min": 1, "max": 2, "last_updated": 0}}))
+    monkeypatch.setattr(tt, "TEMP_LOG_FILE", str(summary_path))
+
+    store = tt.TemperatureStore(str(tmp_path / "raw.ring"), legacy_raw_path=None)
+    now = datetime.now()
+    store.add_many([((now - timedelta(days=d)).timestamp(), 20.0 + d) for d in (20, 10, 0)])
+
+    tt.compact_temperature_logs(store, raw_days=14, summary_days=365)
+
+    assert store.ring.count == 2
+    data = json.loads(summary_path.read_text())
+    old_day = (now - timedelta(days=20)).strftime("%Y-%m-%d")
+    assert data[old_day]["avg"] == 40.0 and data[old_day]["count"] == 1
+    assert "2000-01-01" not in data
+    assert "2000-01-01" in json.loads((tmp_path / "summary.json.1").read_text())
+
+def test_concurrent_summary_writers_do_not_lose_updates(tmp_path, monkeypatch):
+    import json
+    import threading
+    import TerminalTalk_v4 as tt
+
+    summary_path = tmp_path / "summary.json"
+    monkeypatch.setattr(tt, "TEMP_LOG_FILE", str(summary_path))
+
+    def writer(temp):
+        for i in range(20):
+            tt.log_local_temperature([(86400.0 * i, temp)])
+
+    threads = [threading.Thread(target=writer, args=(t,)) for t in (10.0, 30.0)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    data = json.loads(summary_path.read_text())
+    assert len(data) == 20
+    assert all(entry["min"] == 10.0 and entry["max"] == 30.0 for entry in data.values())
+
+def test_led_worker_coalesces_and_preempts():
+    import time
+    from TerminalTalk_v4 import EmulatedSenseHat, FRAME_CACHE, LedDisplayWorker
+
+    display = EmulatedSenseHat()
+    worker = LedDisplayWorker(display)
+    worker.submit([(lambda d: d.push(FRAME_CACHE["start"]), 5)], priority=9, key="idle")
+    worker.start()
+    time.sleep(0.05)
+
+    start = time.monotonic()
+    worker.submit([(lambda d: d.push(FRAME_CACHE["wrong"]), 0)], key="feedback")
+    worker.submit([(lambda d: d.push(FRAME_CACHE["correct"]), 0)], key="feedback")
+    worker.stop(timeout=2)
+
+    assert time.monotonic() - start < 1  # the 5 s idle frame was interrupted
+    shown = [frame for _, frame in display.frames]
+    assert FRAME_CACHE["start"] in shown and FRAME_CACHE["correct"] in shown
+    assert FRAME_CACHE["wrong"] not in shown
+    assert shown[-1] == (((0, 0, 0),) * 64)
+
+
+def test_frame_buffer_pushes_only_changed_pixels():
+    from TerminalTalk_v4 import EmulatedSenseHat, FrameBufferDisplay, render_glyph
+
+    emulator = EmulatedSenseHat()
+    display = FrameBufferDisplay(emulator)
+    display.show_letter("8", (255, 255, 0))
+    writes = emulator.pixel_writes
+    display.show_letter("9", (255, 255, 0))
+
+    assert emulator.pixel_writes - writes == 1  # "8" and "9" differ in one pixel
+    assert tuple(map(tuple, emulator.get_pixels())) == render_glyph("9", (255, 255, 0))
+
+
+def test_idle_display_fires_after_delay_and_disarms():
+    import time
+    from TerminalTalk_v4 import IdleTemperatureDisplay
+
+    shown = []
+    idle = IdleTemperatureDisplay(delay=0.05, show=lambda: shown.append(time.monotonic()))
+    idle.arm()
+    time.sleep(0.2)
+    idle.disarm()
+    count = len(shown)
+    time.sleep(0.15)
+
+    assert count >= 2
+    assert len(shown) == count
+
+def test_sensor_service_smooths_spikes_and_serves_cache():
+    from TerminalTalk_v4 import FakeSensor, SensorService
+
+    sensor = FakeSensor([20.0, 20.0, 35.0, 20.0, 20.0])
+    service = SensorService(sensor, window=3, alpha=0.5)
+    assert service.get_temperature() is None
+
+    raw, smoothed = [], []
+    for _ in range(5):
+        raw.append(service.sample())
+        smoothed.append(service.get_temperature())
+    assert raw == [20.0, 20.0, 35.0, 20.0, 20.0]  # stored values stay raw
+    assert max(smoothed) == 20.0  # the single 35 °C spike is removed by the median
+
+    calls = sensor.calls
+    assert service.get_temperature() == 20.0 and service.last_raw == 20.0
+    assert sensor.calls == calls
+
+def test_lazy_permutation_is_a_permutation():
+    from TerminalTalk_v4 import LazyPermutation
+
+    for n in (1, 2, 7, 100, 1000):
+        perm = LazyPermutation(n, seed=42)
+        assert sorted(perm[i] for i in range(n)) == list(range(n))
+
+
+def test_file_trivia_bank_resumes_without_repeats(tmp_path):
+    import json
+    from TerminalTalk_v4 import FileTriviaBank, TriviaSampler
+
+    bank_path = tmp_path / "bank.jsonl"
+    with open(bank_path, "w") as f:
+        for i in range(30):
+            f.write(json.dumps({"question": f"Q{i}?", "options": ["w", "x", "y", "z"], "correct": "a"}) + "\n")
+    state_path = str(tmp_path / "state.json")
+
+    seen = []
+    for _ in range(3):  # three sessions of ten questions
+        with FileTriviaBank(str(bank_path)) as bank:
+            sampler = TriviaSampler(bank, state_file=state_path)
+            for _ in range(10):
+                seen.append(sampler.next()["question"])
+                sampler.save()
+
+    assert sorted(seen) == sorted(f"Q{i}?" for i in range(30))
+    with FileTriviaBank(str(bank_path)) as bank:
+        assert bank[0]["options"][0] == "A. w"
+    assert bank._file.closed
+
+def test_trivia_skips_malformed_items_and_handles_empty_banks(tmp_path, capsys):
+    import json
+    import TerminalTalk_v4 as tt
+
+    bank_path = tmp_path / "bank.jsonl"
+    bank_path.write_text("\n".join([
+        json.dumps({"question": "Good?", "options": ["w", "x", "y", "z"], "correct": "a"}),
+        "{not json",
+        json.dumps({"question": "No answer key?", "options": ["w", "x", "y", "z"]}),
+        json.dumps({"question": "Three options?", "options": ["w", "x", "y"], "correct": "b"}),
+    ]) + "\n")
+    with tt.FileTriviaBank(str(bank_path)) as bank:
+        sampler = tt.TriviaSampler(bank, state_file=str(tmp_path / "state.json"))
+        assert [sampler.next()["question"] for _ in range(3)] == ["Good?"] * 3
+
+    bad_path = tmp_path / "bad.jsonl"
+    bad_path.write_text("{not json\n")
+    with tt.FileTriviaBank(str(bad_path)) as bank:
+        tt.trivia_game(bank)
+    assert "every question in the bank is malformed" in capsys.readouterr().out
+
+    empty_path = tmp_path / "empty.csv"
+    empty_path.write_text("")
+    with tt.FileTriviaBank(str(empty_path)) as bank:
+        assert len(bank) == 0
+        tt.trivia_game(bank)
+    assert "trivia bank is empty" in capsys.readouterr().out
+
+def test_nearest_answer_indices_blocked_matches_full_and_excludes():
+    import numpy as np
+    from TerminalTalk_v4 import nearest_answer_indices
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    exclude = [{i, (i + 1) % 50} for i in range(50)]
+    exclude[0] = set(range(20))  # more than the spare candidates: full-row fallback
+
+    result = nearest_answer_indices(vectors, 3, exclude, block_bytes=4 * 7 * 12, block_rows=7)
+
+    sims = vectors @ vectors.T
+    for i, picked in enumerate(result):
+        expected = [j for j in np.argsort(-sims[i]) if j not in exclude[i]][:3]
+        assert picked == expected
+
+def test_sqlite_kb_add_and_remove_are_row_level(tmp_path):
+    from TerminalTalk_v4 import SqliteQA
+
+    path = str(tmp_path / "kb.sqlite3")
+    kb = SqliteQA(path, seed={"what is git?": ["A VCS."]})
+    assert kb.add_answers("what is git?", ["A VCS.", "Tracks changes."]) == 1
+    kb.add_answers("what is pip?", ["A package installer."])
+
+    other = SqliteQA(path, seed={"ignored?": ["not seeded twice"]})
+    assert list(other) == ["what is git?", "what is pip?"]
+    assert other["what is git?"] == ["A VCS.", "Tracks changes."]
+
+    assert kb.remove_answers("what is pip?", ["A package installer."]) == 1
+    assert "what is pip?" not in other  # picked up through data_version
+
+    kb.remove_question("what is git?")
+    assert len(SqliteQA(path, seed={"what is git?": ["A VCS."]})) == 0  # seeded only once
+
+def test_embeddings_follow_removals_made_by_another_process(tmp_path, monkeypatch):
+    import TerminalTalk_v4 as tt
+
+    path = str(tmp_path / "kb.sqlite3")
+    seed = {"what is git?": ["A VCS."], "where is the library?": ["Building B."]}
+    monkeypatch.setattr(tt, "QA_DATA", tt.SqliteQA(path, seed=seed))
+    monkeypatch.setattr(tt, "SIMILARITY_THRESHOLD", 0.5)
+    tt.rebuild_embeddings()
+    assert "what is git?" in tt.QUESTION_LIST
+
+    tt.SqliteQA(path).remove_question("what is git?")  # e.g. `--remove` from another shell
+
+    answer, match = tt.answer_question("git what is")
+    assert match == "none" and "don't recognize" in answer
+    assert "what is git?" not in tt.QUESTION_LIST
+
+def test_streaming_import_builds_reusable_index(tmp_path):
+    import TerminalTalk_v4 as tt
+
+    csv_path = tmp_path / "qa.csv"
+    csv_path.write_text(
+        "question,answer1,answer2\n"
+        "What is git?,Old answer,\n"
+        "what is pip?,Installs packages,Python tool\n"
+        "what is git?,A version control system,\n"
+        "empty?,,\n"
+    )
+
+    index = tt.build_import_index(str(csv_path), tt.iter_csv_rows(str(csv_path)), chunk_size=2)
+    assert list(index) == ["what is git?", "what is pip?"]
+    assert index["what is git?"] == ["A version control system"]
+    assert index.embeddings.shape[0] == 2
+
+    reopened = tt.open_import_index(str(csv_path))
+    assert reopened is not None and reopened["what is pip?"] == ["Installs packages", "Python tool"]
+
+    csv_path.write_text("question,answer1\nchanged?,yes\n")
+    assert tt.open_import_index(str(csv_path)) is None
+
+def test_csv_byte_ranges_cover_file_on_line_boundaries(tmp_path):
+    from TerminalTalk_v4 import csv_byte_ranges
+
+    path = tmp_path / "qa.csv"
+    path.write_text("question,answer1\n" + "".join(f"q{i}?,answer number {i}\n" for i in range(500)))
+
+    fieldnames, ranges = csv_byte_ranges(str(path), range_bytes=300)
+    data = path.read_bytes()
+
+    assert fieldnames == ["question", "answer1"]
+    assert ranges[0][0] == len("question,answer1\n") and ranges[-1][1] == len(data)
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert all(data[end - 1:end] == b"\n" for _, end in ranges)
+
+def test_parallel_import_matches_sequential_import(tmp_path, monkeypatch):
+    import functools
+    import numpy as np
+    import TerminalTalk_v4 as tt
+
+    path = tmp_path / "qa.csv"
+    rows = [f"q{i % 150}?,answer {i}\n" for i in range(400)]  # repeats: last row wins
+    path.write_text(" question , answer1\n" + "".join(rows))  # padded header names
+    monkeypatch.setattr(tt, "csv_byte_ranges", functools.partial(tt.csv_byte_ranges, range_bytes=256))
+
+    sequential = tt.build_import_index(str(path), tt.iter_kb_rows(str(path)), quiet=True)
+    expected = {q: sequential[q] for q in sequential}
+    expected_vectors = {q: np.array(sequential.embeddings[row]) for q, row in sequential.vector_rows(expected).items()}
+
+    parallel = tt.build_import_index_parallel(str(path), workers=2)
+    assert len(expected) == 150
+    assert list(parallel) == list(expected)
+    assert {q: parallel[q] for q in parallel} == expected
+    for q, row in parallel.vector_rows(expected).items():
+        assert np.allclose(parallel.embeddings[row], expected_vectors[q])
+
+def test_parallel_import_falls_back_on_multiline_quoted_fields(tmp_path, monkeypatch, capsys):
+    import functools
+    import TerminalTalk_v4 as tt
+
+    path = tmp_path / "qa.csv"
+    long_answer = "\n".join(f"line {i} of a long answer" for i in range(40))
+    path.write_text(
+        "question,answer1\n"
+        + "".join(f"q{i}?,short {i}\n" for i in range(20))
+        + f'multi?,"{long_answer}"\n'
+        + "".join(f"r{i}?,short {i}\n" for i in range(20))
+    )
+    monkeypatch.setattr(tt, "csv_byte_ranges", functools.partial(tt.csv_byte_ranges, range_bytes=200))
+    monkeypatch.setattr(tt, "IMPORTED_QA", None)
+
+    tt.load_questions_from_csv(str(path), workers=2)
+
+    assert "importing sequentially" in capsys.readouterr().out
+    assert len(tt.IMPORTED_QA) == 41
+    assert tt.IMPORTED_QA["multi?"] == [long_answer]
+
+def test_compiled_bundle_round_trip(tmp_path, monkeypatch):
+    import numpy as np
+    import TerminalTalk_v4 as tt
+
+    bundle_path = tmp_path / "kb.ttbundle"
+    meta = tt.compile_bundle(
+        [("what is git?", ["Version control.", "Shared answer."]),
+         ("what is pip?", ["Shared answer."])],
+        str(bundle_path),
+    )
+    assert meta["questions"] == 2 and meta["answers"] == 2  # answers interned
+
+    bundle = tt.BundleQA(str(bundle_path), verify=True)
+
+    def no_rebuild(self):
+        raise AssertionError("bundle lookups must use the stored hash index")
+    monkeypatch.setattr(tt.StringTable, "_build_index", no_rebuild)
+    assert list(bundle) == ["what is git?", "what is pip?"]
+    assert bundle["what is pip?"] == ["Shared answer."] and "what is svn?" not in bundle
+    assert np.allclose(np.linalg.norm(bundle.embeddings, axis=1), 1.0)
+
+    data = bytearray(bundle_path.read_bytes())
+    data[-1] ^= 0xFF
+    bundle_path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        tt.BundleQA(str(bundle_path), verify=True)
+
+def test_kb_watcher_reembeds_only_changed_questions(tmp_path, monkeypatch):
+    import os
+    import TerminalTalk_v4 as tt
+
+    csv_path = tmp_path / "qa.csv"
+    csv_path.write_text("question,answer1\nwhat is git?,VCS\nwhat is pip?,Installer\n")
+    monkeypatch.setattr(tt, "IMPORTED_QA", tt.build_import_index(str(csv_path), tt.iter_csv_rows(str(csv_path))))
+    monkeypatch.setattr(tt, "_PENDING_KB", None)
+    watcher = tt.KbWatcher(str(csv_path))
+
+    os.utime(csv_path, ns=(1, 1))  # touched, same content
+    assert watcher.check() is None
+
+    csv_path.write_text("question,answer1\nwhat is git?,Version control\nwhat is venv?,Isolated env\n")
+    stats = watcher.check()
+    assert (stats["added"], stats["removed"]) == (1, 1)
+
+    assert tt.apply_pending_kb()
+    assert tt.IMPORTED_QA["what is git?"] == ["Version control"]
+    assert "what is pip?" not in tt.IMPORTED_QA and tt.QUESTION_EMBEDDINGS is None
+
+def test_near_duplicate_merge_folds_answers_and_keeps_rows_aligned(tmp_path):
+    import numpy as np
+    import TerminalTalk_v4 as tt
+
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=(4, 8)).astype(np.float32)
+    vectors = np.vstack([base, base[0] + 0.01, base[2] + 0.01])  # rows 4, 5 paraphrase rows 0, 2
+
+    canonical = tt.find_near_duplicates(vectors, threshold=0.99, block_size=3)
+    assert canonical.tolist() == [0, 1, 2, 3, 0, 2]
+
+    source = tmp_path / "qa.csv"
+    source.write_text("question,answer1\n")
+    writer = tt.ImportIndexWriter(str(source))
+    questions = ["what is git?", "q1", "q2", "q3", "what's git", "q2 again"]
+    writer.add_chunk([(q, [f"answer {i}"]) for i, q in enumerate(questions)], vectors)
+    merged = writer.merge_near_duplicates(0.99)
+    writer.finish({})
+
+    assert merged == [("what is git?", "what's git"), ("q2", "q2 again")]
+    index = tt.IndexedQA(str(source))
+    assert list(index) == ["what is git?", "q1", "q2", "q3"]
+    assert index["what is git?"] == ["answer 0", "answer 4"]
+    assert np.allclose(index.embeddings, base)
+
+def test_compact_qa_interns_answers_and_matches_like_a_dict(monkeypatch):
+    import TerminalTalk_v4 as tt
+
+    items = [("what is git?", ["VCS", "Shared"]), ("what is pip?", ["Shared"]),
+             ("git", ["short"]), ("what is git?", ["Newest", "Shared"])]
+    qa = tt.CompactQA.from_items(items)
+    plain = dict(items)
+
+    assert list(qa) == list(plain) and len(qa.answers) == 3
+    assert qa["what is git?"] == ["Newest", "Shared"] and "nope" not in qa
+    assert not hasattr(qa, "__dict__")
+
+    for linear_scan_max in (tt.StringTable.LINEAR_SCAN_MAX, 0):  # scan, then hashed lookup
+        monkeypatch.setattr(tt.StringTable, "LINEAR_SCAN_MAX", linear_scan_max)
+        for q in ["what is git? please", "pip", "git", "is", "unknown question"]:
+            assert tt.find_substring_key(qa, q) == tt.find_substring_key(plain, q)
+
+def test_jsonl_and_wide_csv_imports_share_the_chunked_pipeline(tmp_path):
+    import TerminalTalk_v4 as tt
+
+    jsonl = tmp_path / "kb.jsonl"
+    jsonl.write_text(
+        '{"question": "What is git?", "answers": ["A", "B", "C", "D", "E"], "tags": ["tools"]}\n'
+        "not json\n"
+        '{"question": "what is pip?", "answer": "Installer"}\n'
+        '{"question": "no answers", "answers": []}\n'
+        '{"question": "bad tags?", "answer": "skipped", "tags": 5}\n'
+        '{"question": "what is npm?", "answer": "Installer", "tags": " js "}\n'
+    )
+    index = tt.build_import_index(str(jsonl), tt.iter_kb_rows(str(jsonl)), chunk_size=1)
+    assert index["what is git?"] == ["A", "B", "C", "D", "E"]
+    assert index.tags("what is git?") == ["tools"] and index.tags("what is pip?") == []
+    assert index.tags("what is npm?") == ["js"] and "bad tags?" not in index
+    assert len(index) == len(index.embeddings) == 3
+
+    wide = tmp_path / "wide.csv"
+    wide.write_text("question,answer2,answer10,answer1,notes,\nWhat is git?,two,ten,one,x,\n")
+    assert list(tt.iter_kb_rows(str(wide))) == [("what is git?", ["one", "two", "ten"])]
+
+def test_benchmark_reports_percentiles_for_every_stage():
+    import TerminalTalk_v4 as tt
+    import benchmark_terminaltalk as bench
+
+    store, span = tt.TEMPERATURE_STORE, tt.span
+    result = bench.benchmark_size(300, queries=6, embed_sample=20)
+    stages = result["stages"]
+
+    assert set(stages) == set(bench.STAGES)
+    assert stages["total"]["n"] == stages["substring"]["n"] == 6
+    assert stages["enrichment"]["n"] <= stages["location_intent"]["n"]  # location questions only
+    assert all(s["p50_ms"] <= s["p99_ms"] for s in stages.values() if s["n"])
+    assert tt.TEMPERATURE_STORE is store and tt.span is span  # restored afterwards
+    assert result["rebuild_embeddings"]["questions"] == 20
+
+def test_startup_profile_rows_and_importtime_tree():
+    import TerminalTalk_v4 as tt
+
+    rows = tt.startup_report([("start", 1.0, 0.5, 0), ("numpy", 1.25, 0.7, 2**20)])
+    assert rows[1][:2] == ("numpy", 250.0) and rows[1][3] == 1.0
+
+    tree = tt.parse_importtime([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       100 |        100 |     numpy.core",
+        "import time:      2000 |       2100 |   numpy",
+        "import time:       300 |        300 |   json",
+        "import time:       500 |       2900 | TerminalTalk_v4",
+    ])
+    assert [n["name"] for n in tree] == ["TerminalTalk_v4"]
+    assert [c["name"] for c in tree[0]["children"]] == ["numpy", "json"]
+    assert tree[0]["children"][0]["children"][0]["cumulative_ms"] == 0.1
+
+def test_latency_spans_record_only_when_enabled(monkeypatch):
+    import collections
+    import TerminalTalk_v4 as tt
+
+    monkeypatch.setattr(tt, "LATENCY_STATS", collections.defaultdict(tt.LatencyHistogram))
+    monkeypatch.setattr(tt, "fetch_weather", lambda city: "Weather stub")
+
+    monkeypatch.setattr(tt, "LATENCY_ENABLED", False)
+    tt.get_answer("what is git?")
+    assert not tt.LATENCY_STATS
+
+    monkeypatch.setattr(tt, "LATENCY_ENABLED", True)
+    tt.get_answer("what is git?")
+    tt.get_answer("a question nobody has asked before")
+    stats = tt.LATENCY_STATS
+    assert stats["answer.total"].count == 2 and stats["answer.substring"].count == 2
+    assert stats["answer.embed_query"].count == 1 and stats["answer.similarity"].count == 1
+    assert "answer.total" in tt.format_latency_stats()
+
+    h = tt.LatencyHistogram()
+    for ms in (0.3, 0.3, 0.3, 40.0):
+        h.observe(ms)
+    assert h.percentile(50) == 0.5 and h.percentile(99) == 40.0
+
+def test_metrics_shards_sum_across_threads_and_render_prometheus_text():
+    import threading
+    import TerminalTalk_v4 as tt
+
+    registry = tt.MetricsRegistry()
+
+    def work():
+        for _ in range(1000):
+            registry.inc("terminaltalk_questions_total", (("match", "substring"),))
+        registry.observe("terminaltalk_semantic_score", 0.42)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    text = registry.render()
+    assert not registry._shards  # finished threads were folded into the base totals
+    assert 'terminaltalk_questions_total{match="substring"} 4000' in text
+    assert 'terminaltalk_semantic_score_bucket{le="0.4"} 0' in text
+    assert 'terminaltalk_semantic_score_bucket{le="0.45"} 4' in text
+    assert 'terminaltalk_semantic_score_bucket{le="+Inf"} 4' in text
+    assert "terminaltalk_semantic_score_count 4" in text
+
+def test_server_answers_and_exposes_metrics():
+    import http.server
+    import json
+    import threading
+    import urllib.request
+    import TerminalTalk_v4 as tt
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), tt.TerminalTalkRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{base}/ask?q=what%20is%20git%3F") as r:
+            reply = json.loads(r.read())
+        assert reply["match"] == "substring" and "Git" in reply["answer"]
+        with urllib.request.urlopen(f"{base}/metrics") as r:
+            assert 'terminaltalk_questions_total{match="substring"}' in r.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_server_metric_shards_stay_bounded_across_requests():
+    import http.server
+    import threading
+    import urllib.request
+    import TerminalTalk_v4 as tt
+
+    def answered():
+        return tt.METRICS.collect().get(("terminaltalk_questions_total", (("match", "substring"),)), 0)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), tt.TerminalTalkRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    before = answered()
+    try:
+        for _ in range(100):  # one handler thread, and one shard, per request
+            with urllib.request.urlopen(f"{base}/ask?q=what%20is%20git%3F") as r:
+                r.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(tt.METRICS._shards) < 10
+    assert answered() - before == 100
+
+def test_queued_json_logging_rotates_and_skips_filtered_arguments(tmp_path):
+    import json
+    import logging
+    import TerminalTalk_v4 as tt
+
+    log_file = tmp_path / "tt.log"
+    root = tt.setup_logging(True, "INFO", str(log_file), False, log_format="json", max_bytes=2000, backups=2)
+    try:
+        class Expensive:
+            def __str__(self):
+                raise AssertionError("debug argument formatted while DEBUG is filtered")
+
+        assert not logging.getLogger("TerminalTalk_v4").isEnabledFor(logging.DEBUG)
+        logging.getLogger("TerminalTalk_v4").debug("never shown %s", Expensive())
+        for i in range(60):
+            logging.getLogger("TerminalTalk_v4").info("Received question: %s", f"question {i}")
+        pending = ["first"]
+        logging.getLogger("TerminalTalk_v4").info("Pending: %s", pending)
+        pending.append("added after the call")
+    finally:
+        tt.stop_logging()
+        for h in list(root.handlers):
+            root.removeHandler(h)
+        root.setLevel(logging.WARNING)
+
+    lines = log_file.read_text(encoding="utf-8").splitlines()
+    assert (tmp_path / "tt.log.1").exists() and not (tmp_path / "tt.log.3").exists()
+    entry = json.loads(lines[-2])
+    assert entry["level"] == "INFO" and entry["message"] == "Received question: question 59"
+    assert json.loads(lines[-1])["message"] == "Pending: ['first']"  # args frozen at call time
+
+def test_log_replay_classifies_baseline_and_replays_against_server(tmp_path, monkeypatch):
+    import http.server
+    import logging
+    import threading
+    import TerminalTalk_v4 as tt
+    import replay_terminaltalk_log as replay
+
+    monkeypatch.setattr(tt, "_location_enrichment", lambda: ("Weather unavailable.", "No data."))
+    asked = {
+        "text": ["what is git?", "git what is", "find library location", "blorf"],
+        "json": ["what is git?"],
+    }
+    logs, expected = [], {}
+    for log_format, questions in asked.items():
+        # Real app output: the same logging setup and answer path as chat mode
+        log_file = tmp_path / f"terminaltalk.{log_format}.log"
+        root = tt.setup_logging(True, "INFO", str(log_file), False, log_format=log_format)
+        try:
+            for q in questions:
+                expected[q] = tt.answer_question(q)[1]
+        finally:
+            tt.stop_logging()
+            for h in list(root.handlers):
+                root.removeHandler(h)
+            root.setLevel(logging.WARNING)
+        logs.append(str(log_file))
+    # "git what is" logs "Semantic match" and then "No match found" (not a location question)
+    assert expected == {"what is git?": "substring", "git what is": "none",
+                        "find library location": "semantic", "blorf": "none"}
+
+    questions = list(replay.iter_log_questions(logs))
+    assert [(q.question, q.match) for q in questions] == [
+        (q, expected[q]) for q in asked["text"] + asked["json"]
+    ]
+
+    timeline = [replay.LogQuestion(ts, "q", "none") for ts in (100.0, 100.5, 101.0, 200.0)]
+    offsets = [offset for offset, _ in replay.schedule(timeline, speed=10, max_gap=5)]
+    assert offsets == pytest.approx([0.0, 0.05, 0.1, 0.6])
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), tt.TerminalTalkRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        target = replay.ServerTarget(2, f"http://127.0.0.1:{server.server_address[1]}")
+        results, start = replay.replay(target, replay.schedule(questions, speed=100), concurrency=2)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    summary = replay.summarize(results, start)
+    assert summary["requests"] == 5 and summary["errors"] == 0
+    assert summary["changed_matches"] == 0
+    assert all(drift == 0 for drift in summary["match_drift_pp"].values())
+    assert summary["latency_ms"]["p50"] <= summary["latency_ms"]["max"]